@@ -1,4 +1,5 @@
 from typing import Optional
+import asyncio
 from pydantic import BaseModel
 from crewai import Task, Flow
 from config import CONNECTION_PARAMETER, MODEL_NAME, MODEL_TEMPERATURE
@@ -58,6 +59,8 @@ class StreamlitAppGenerationFlow(Flow):
             self.requirement_agent = RequirementAgent(self.llm, [self.search_req_tool])
             self.data_agent = DataAnalysisAgent(self.llm, [self.analysis_tool])
             self.researcher_agent = ResearcherAgent(self.llm, [self.search_tech_tool])
+            # Separate instance so component validation can run alongside pattern research
+            self.validator_agent = ResearcherAgent(self.llm, [self.search_tech_tool])
             self.coder_agent = CoderAgent(self.llm)
         except Exception as e:
             logger.error(f"Error during initialization: {str(e)}")
@@ -105,7 +108,7 @@ class StreamlitAppGenerationFlow(Flow):
             raise
 
     @listen(process_requirements)
-    def analyze_data_needs(self, requirements):
+    async def analyze_data_needs(self, requirements):
         """Analyze data requirements based on technical specifications"""
         logger.debug("Starting data needs analysis")
         try:
@@ -129,7 +132,7 @@ class StreamlitAppGenerationFlow(Flow):
                 - Python code examples for data integration""",
                 agent=self.data_agent
             )
-            result = task.agent.execute_task(task)
+            result = await asyncio.to_thread(task.agent.execute_task, task)
             logger.debug(f"Data analysis result: {result}")
             
             self.result.data_analysis = result
@@ -139,7 +142,7 @@ class StreamlitAppGenerationFlow(Flow):
             raise
 
     @listen(analyze_data_needs)
-    def research_data_patterns(self, data_analysis):
+    async def research_data_patterns(self, data_analysis):
         """Research data analysis patterns"""
         logger.debug("Starting data analysis patterns research")
         try:
@@ -152,7 +155,7 @@ class StreamlitAppGenerationFlow(Flow):
                 expected_output="Snowflake in Streamlit Data integration patterns, example code, and best practices",
                 agent=self.researcher_agent
             )
-            patterns = task.agent.execute_task(task)
+            patterns = await asyncio.to_thread(task.agent.execute_task, task)
             logger.debug(f"Data patterns result: {patterns}")
             
             self.result.reference_patterns["data"] = patterns
@@ -161,21 +164,21 @@ class StreamlitAppGenerationFlow(Flow):
             logger.error(f"Error in research_data_patterns: {str(e)}")
             raise
 
-    @listen(research_data_patterns)
-    def validate_streamlit_components(self, patterns):
-        """Validate Streamlit component usage"""
+    @listen(process_requirements)
+    async def validate_streamlit_components(self, requirements):
+        """Validate Streamlit component usage (runs concurrently with the data branch)"""
         logger.debug("Starting component validation")
         try:
             task = Task(
                 description=f"""Validate Streamlit implementation code using 'search_tech_tool' (pass 'streamlit' as tech_stack parameter) tools to search streamlit 
                 documentation to make sure it is using latest syntax and best practice.
                 
-                Validate this:
-                {patterns}""",
+                Validate the Streamlit components needed for these requirements:
+                {requirements}""",
                 expected_output="Validated Streamlit code component usage and best practices to fulfill the requirements align with streamlit latest documentation",
-                agent=self.researcher_agent
+                agent=self.validator_agent
             )
-            components = task.agent.execute_task(task)
+            components = await asyncio.to_thread(task.agent.execute_task, task)
             logger.debug(f"Component validation result: {components}")
             
             self.result.streamlit_components = components
@@ -184,11 +187,13 @@ class StreamlitAppGenerationFlow(Flow):
             logger.error(f"Error in validate_streamlit_components: {str(e)}")
             raise
 
-    @listen(validate_streamlit_components)
-    def generate_final_code(self, components):
-        """Generate the final Streamlit application code"""
+    @listen(and_(research_data_patterns, validate_streamlit_components))
+    def generate_final_code(self):
+        """Generate the final Streamlit application code from both research branches"""
         logger.debug("Starting code generation")
         try:
+            patterns = self.result.reference_patterns.get("data", "")
+            components = self.result.streamlit_components
             task = Task(
                 description=f"""
                 MAIN TASK: 
@@ -196,6 +201,7 @@ class StreamlitAppGenerationFlow(Flow):
                 1. Fullfill this requirements: {self.result.requirements}, please also provide error handler since you will generate a production ready streamlit code. Do not use any dummy or example data/function/component.
                 2. Data Needed from Snowflake Tables: {self.result.data_analysis}. DO NOT make any columns or tables outside this.
                 3. Streamlit latest syntax for components use: {components}.
+                4. Snowflake data integration patterns to follow: {patterns}.
 
                 
                 ERROR Handling and Prevention:
@@ -10,6 +10,7 @@ from config import CONNECTION_PARAMETER, MODEL_NAME, MODEL_TEMPERATURE, STREAMLI
 from tools.text_to_sql import SnowflakeTableTool, RAGSQLGenerator
 from tools.text_to_sklearn import SklearnImplementationTool, RAGSklearnGenerator
 from tools.text_to_matplotlib import MatplotlibVisualizationTool, RAGPythonGenerator
+from tools.session_pool import SessionPool, get_session_pool
 import logging
 import json
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -40,9 +41,12 @@ class AnalysisResult:
     streamlit_code: str
 
 class DataScienceFlow:
-    def __init__(self, session: Optional[Session] = None):
+    def __init__(self, session: Optional[Session] = None, pool: Optional[SessionPool] = None):
         """Initialize with shared resources for better performance"""
         self.session = session or Session.builder.configs(CONNECTION_PARAMETER).create()
+        # Parallel sklearn/viz generation borrows pooled sessions instead of queueing on one;
+        # the shared pool only opens sessions on first borrow
+        self.pool = pool or get_session_pool()
         self.root = Root(self.session)
         
         # Initialize all generators with shared session
@@ -51,16 +55,17 @@ class DataScienceFlow:
 
     def initialize_generators(self):
         """Initialize all RAG generators with shared session"""
-        self.sql_generator = RAGSQLGenerator(session=self.session)
-        self.sklearn_generator = RAGSklearnGenerator(session=self.session)
-        self.viz_generator = RAGPythonGenerator(session=self.session)
+        self.sql_generator = RAGSQLGenerator(session=self.session, pool=self.pool)
+        self.sklearn_generator = RAGSklearnGenerator(session=self.session, pool=self.pool)
+        self.viz_generator = RAGPythonGenerator(session=self.session, pool=self.pool)
 
     def initialize_tools(self):
         """Initialize all tools with shared generators"""
         self.snowflake_tool = SnowflakeTableTool(
             snowpark_session=self.session,
             rag_generator=self.sql_generator,
-            result_as_answer=True
+            result_as_answer=True,
+            pool=self.pool
         )
         
         self.sklearn_tool = SklearnImplementationTool(
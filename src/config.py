@@ -16,6 +16,7 @@ DATABASE = os.getenv("SNOWFLAKE_DATABASE")
 SCHEMA = os.getenv("SNOWFLAKE_SCHEMA")
 WAREHOUSE = os.getenv("SNOWFLAKE_WAREHOUSE")
 MODEL_NAME = "mistral-large2"
+SMALL_MODEL_NAME = "llama3.1-8b"
 MODEL_TEMPERATURE = 0.9
 
 STREAMLIT_TEMPLATE = """
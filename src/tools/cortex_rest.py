@@ -0,0 +1,135 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from snowflake.snowpark.session import Session
+from tools import fast_json
+import httpx
+
+COMPLETE_TIMEOUT = 300
+SEARCH_TIMEOUT = 30
+
+# One HTTP/2 client for every Cortex REST call in the process: search and complete
+# requests from all tools are multiplexed over the same kept-alive connection
+_http = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=10),
+    timeout=SEARCH_TIMEOUT
+)
+
+def _base_url(session: Session) -> str:
+    return f"https://{session.connection.host}"
+
+def _headers(session: Session, accept: str = "text/event-stream") -> dict:
+    return {
+        "Authorization": f'Snowflake Token="{session.connection.rest.token}"',
+        "Content-Type": "application/json",
+        "Accept": accept,
+    }
+
+def complete_stream(
+    session: Session,
+    model: str,
+    prompt: str,
+    on_token: Optional[Callable[[str], None]] = None,
+    system: Optional[str] = None
+) -> str:
+    """Run Cortex Complete through the streaming REST endpoint
+
+    Args:
+        session: Snowflake session used for host and authentication
+        model: Name of the Cortex model
+        prompt: User prompt
+        on_token: Optional callback invoked with each token as it arrives
+        system: Optional system message; keeping static instructions here gives every
+            call the same prompt prefix
+
+    Returns:
+        The full response text
+    """
+    messages = [{"role": "user", "content": prompt}]
+    if system:
+        messages.insert(0, {"role": "system", "content": system})
+    body = {
+        "model": model,
+        "messages": messages,
+        "stream": True,
+    }
+
+    parts = []
+    with _http.stream(
+        "POST",
+        f"{_base_url(session)}/api/v2/cortex/inference:complete",
+        json=body,
+        headers=_headers(session),
+        timeout=COMPLETE_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            for choice in fast_json.loads(data).get("choices", []):
+                delta = choice.get("delta", {})
+                token = delta.get("content") or delta.get("text") or ""
+                if token:
+                    parts.append(token)
+                    if on_token:
+                        on_token(token)
+
+    return "".join(parts)
+
+class SearchResponse(NamedTuple):
+    results: List[dict]
+
+class CortexSearchService:
+    """Cortex Search service queried through its REST endpoint
+
+    Drop-in for the `snowflake.core` service handle's `search()`, without walking the
+    Root -> database -> schema -> service proxy chain on each call.
+    """
+
+    def __init__(self, session: Session, database: str, schema: str, service_name: str):
+        self._session = session
+        database, schema = database.strip('"'), schema.strip('"')
+        self._url = (
+            f"{_base_url(session)}/api/v2/databases/{database}"
+            f"/schemas/{schema}/cortex-search-services/{service_name}:query"
+        )
+
+    def search(self, query: str, columns: Sequence[str], limit: int) -> SearchResponse:
+        response = _http.post(
+            self._url,
+            json={"query": query, "columns": list(columns), "limit": limit},
+            headers=_headers(self._session, accept="application/json")
+        )
+        response.raise_for_status()
+        return SearchResponse(results=response.json().get("results", []))
+
+class CortexSearchServices:
+    """Cortex Search REST handles of one session, built once per service name
+
+    The session's current database and schema are read on the first lookup rather
+    than at construction, and kept from then on.
+    """
+
+    def __init__(self, session: Session):
+        self._session = session
+        self._location: Optional[Tuple[str, str]] = None
+        self._services: Dict[str, CortexSearchService] = {}
+
+    @property
+    def location(self) -> Tuple[str, str]:
+        """(database, schema) the services are resolved in"""
+        if self._location is None:
+            database = self._session.get_current_database()
+            schema = self._session.get_current_schema()
+            if not database or not schema:
+                raise ValueError("The session needs a current database and schema to query Cortex Search")
+            self._location = (database, schema)
+        return self._location
+
+    def get(self, service_name: str) -> CortexSearchService:
+        if service_name not in self._services:
+            database, schema = self.location
+            self._services[service_name] = CortexSearchService(self._session, database, schema, service_name)
+        return self._services[service_name]
@@ -2,8 +2,112 @@ from snowflake.snowpark.session import Session
 from snowflake.core import Root
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from config import DATABASE, SCHEMA, WAREHOUSE
+from tools.search_cache import search_cache
 from enum import Enum
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import hashlib
+import io
+import os
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import xxhash
+except ImportError:  # optional, falls back to hashlib
+    xxhash = None
+
+try:
+    from semantic_text_splitter import TextSplitter
+except ImportError:  # optional, falls back to LangChain's splitter
+    TextSplitter = None
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:  # optional, falls back to pypdf
+    fitz = None
+
+def hash_bytes(data: bytes) -> bytes:
+    """16-byte non-cryptographic digest used to deduplicate chunks"""
+    if xxhash is not None:
+        return xxhash.xxh3_128(data).digest()
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+# Rows per Parquet file uploaded by write_pandas, and how many files are PUT at once
+WRITE_CHUNK_ROWS = 1000
+WRITE_PARALLEL = 8
+
+REMOTE_PREFIXES = ("s3://", "gs://", "gcs://", "http://", "https://")
+
+# Minimum pages handed to one extraction process, below this a single process is faster
+# (PyMuPDF parses pages in C, so it needs far more pages to amortize a process)
+PAGES_PER_WORKER = 200 if fitz is not None else 20
+
+# Pages handed to the Rust splitter per chunk_all() call while extraction streams on
+SPLIT_PAGE_BATCH = 64
+
+# Extra fsspec backend needed per remote scheme (http(s) uses aiohttp)
+_REMOTE_BACKENDS = {"s3://": "s3fs", "gs://": "gcsfs", "gcs://": "gcsfs"}
+
+def _open_remote(file_path: str, mode: str, **kwargs):
+    """Open a remote document with fsspec, with a clear error when a backend is missing"""
+    try:
+        import fsspec
+        return fsspec.open(file_path, mode, **kwargs).open()
+    except ImportError as e:
+        backend = next(
+            (name for prefix, name in _REMOTE_BACKENDS.items() if file_path.startswith(prefix)),
+            "aiohttp"
+        )
+        raise ImportError(
+            f"Reading {file_path} requires fsspec and {backend}: pip install fsspec {backend}"
+        ) from e
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> List[str]:
+    """Extract text of pages [start, stop) in a worker process"""
+    if fitz is not None:
+        with fitz.open(file_path) as doc:
+            return [doc.load_page(i).get_text("text") for i in range(start, stop)]
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or '' for i in range(start, stop)]
+
+def _pdf_page_count(file_path: str) -> int:
+    if fitz is not None:
+        with fitz.open(file_path) as doc:
+            return doc.page_count
+    from pypdf import PdfReader
+    return len(PdfReader(file_path).pages)
+
+def _iter_pdf_pages(file_path: str, split_pages: bool = True) -> Iterator[str]:
+    """Yield page texts of a local PDF, splitting large files across processes
+    
+    Pages are parsed with PyMuPDF when installed, pypdf otherwise. Neither releases
+    the GIL (and PyMuPDF documents are not thread-safe), so page ranges are parsed
+    in separate processes rather than threads. Pages are yielded in document order.
+    With split_pages=False (already inside a worker process) pages are parsed in
+    this process.
+    """
+    page_count = _pdf_page_count(file_path)
+    workers = min(os.cpu_count() or 1, page_count // PAGES_PER_WORKER) if split_pages else 1
+    if workers <= 1:
+        yield from _extract_page_range(file_path, 0, page_count)
+        return
+
+    step = -(-page_count // workers)
+    starts = list(range(0, page_count, step))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for texts in executor.map(
+            _extract_page_range,
+            [file_path] * len(starts),
+            starts,
+            [min(start + step, page_count) for start in starts]
+        ):
+            yield from texts
 
 class DocumentType(Enum):
     REQUIREMENTS = "req_docs"
@@ -11,6 +115,19 @@ class DocumentType(Enum):
     ST_REF_DOCS = "streamlit_appgalery"
 
 class DocumentProcessor:
+    DEFAULT_CHUNK_SIZE = 1000
+    # Built once at import; a fresh splitter is only made for non-default chunk sizes
+    _SPLITTER = RecursiveCharacterTextSplitter(
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        chunk_overlap=200,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
+    )
+    # Rust splitter, chunks a batch of texts across all cores
+    _FAST_SPLITTER = (
+        TextSplitter((DEFAULT_CHUNK_SIZE - 200, DEFAULT_CHUNK_SIZE), overlap=200)
+        if TextSplitter is not None else None
+    )
 
     def __init__(self, snowpark_session: Session):
         self.session = snowpark_session
@@ -18,28 +135,41 @@ class DocumentProcessor:
         self.init_snowflake_storage()
     
     def init_snowflake_storage(self):
-        """Initialize Snowflake tables and search services"""
-        self.session.sql(f"USE DATABASE {DATABASE}").collect()
-        self.session.sql(f"USE SCHEMA {SCHEMA}").collect()
+        """Initialize Snowflake tables and search services in a single round trip"""
+        statements = [
+            # A qualified USE SCHEMA also sets the current database
+            f"USE SCHEMA {DATABASE}.{SCHEMA}",
+            *self._document_table_sql(DocumentType.REQUIREMENTS),
+            self._search_service_sql(DocumentType.REQUIREMENTS),
+        ]
         
-        self._create_document_table(DocumentType.REQUIREMENTS)
-        self._create_search_service(DocumentType.REQUIREMENTS)
-        print("Storing PDF...")
+        # Snowpark's session.sql() runs one statement per call, so the DDL goes through
+        # the connector as one multi-statement request instead
+        with self.session.connection.cursor() as cursor:
+            cursor.execute(";\n".join(statements), num_statements=len(statements))
+        # Cached search results may predate the table and service created here
+        search_cache.clear()
+        logger.debug("Chunked PDF Table and Search Service Created...")
+        logger.debug("Storing PDF...")
 
-    def _create_document_table(self, doc_type: DocumentType):
-        self.session.sql(f"""
+    def _document_table_sql(self, doc_type: DocumentType) -> List[str]:
+        return [
+            f"""
             CREATE TABLE IF NOT EXISTS {doc_type.value}_chunks (
                 id INTEGER AUTOINCREMENT,
                 doc_text STRING,
                 source STRING,
-                metadata VARIANT
+                metadata VARIANT,
+                content_hash BINARY(16)
             )
-        """).collect()
-        print("Chunked PDF Table Created...")
+            """,
+            # Tables created before content hashing was introduced
+            f"ALTER TABLE {doc_type.value}_chunks ADD COLUMN IF NOT EXISTS content_hash BINARY(16)",
+        ]
 
-    def _create_search_service(self, doc_type: DocumentType):
-        self.session.sql(f"""
-            CREATE OR REPLACE CORTEX SEARCH SERVICE {doc_type.value}_search_svc
+    def _search_service_sql(self, doc_type: DocumentType) -> str:
+        return f"""
+            CREATE CORTEX SEARCH SERVICE IF NOT EXISTS {doc_type.value}_search_svc
             ON doc_text
             WAREHOUSE = {WAREHOUSE}
             TARGET_LAG = '1 hour'
@@ -49,26 +179,116 @@ class DocumentProcessor:
                     source,
                     metadata
                 FROM {doc_type.value}_chunks
-        """).collect()
-        print("Chunked PDF Search Service Created...")
+            """
 
     def process_document(self, file_path: str, doc_type: DocumentType, source: str = None) -> List[str]:
         """Process document and split into chunks"""
+        chunks = self._parse_and_split(file_path)
+        self._store_chunks(chunks, doc_type, source or file_path)
+        return chunks
+
+    def process_documents(
+        self,
+        file_paths: List[str],
+        doc_type: DocumentType,
+        sources: Optional[List[str]] = None
+    ) -> Dict[str, List[str]]:
+        """Process several documents, parsing them in parallel and storing them together
+        
+        Parsing is CPU bound and holds the GIL, so documents are spread over one process
+        pool sized to the CPU count; each worker parses its document's pages itself
+        rather than opening a nested pool. A single document keeps the page-level split.
+        
+        Args:
+            file_paths: Documents to ingest
+            doc_type: Type shared by all documents
+            sources: Optional source label per document, defaults to the file path
+            
+        Returns:
+            Chunks per source
+            
+        Raises:
+            ValueError: If sources and file_paths differ in length, or sources repeat
+        """
+        sources = sources or file_paths
+        if len(sources) != len(file_paths):
+            raise ValueError(f"Got {len(sources)} sources for {len(file_paths)} documents")
+        if len(set(sources)) != len(sources):
+            raise ValueError("Each document needs a distinct source")
+        if len(file_paths) <= 1:
+            chunks_per_file = [self._parse_and_split(file_path) for file_path in file_paths]
+        else:
+            with ProcessPoolExecutor(max_workers=min(len(file_paths), os.cpu_count() or 1)) as executor:
+                chunks_per_file = list(executor.map(
+                    partial(DocumentProcessor._parse_and_split, split_pages=False),
+                    file_paths
+                ))
+        
+        chunks_by_source = dict(zip(sources, chunks_per_file))
+        self._store_sources(chunks_by_source, doc_type)
+        return chunks_by_source
+
+    @classmethod
+    def _parse_and_split(cls, file_path: str, split_pages: bool = True) -> List[str]:
+        """Read a local or remote document and split it into chunks
+        
+        A classmethod, so it can run in a worker process without the Snowpark session.
+        """
+        is_remote = file_path.startswith(REMOTE_PREFIXES)
         if file_path.lower().endswith('.pdf'):
-            from langchain_community.document_loaders import PyPDFLoader
-            loader = PyPDFLoader(file_path)
-            pages = loader.load()
-            content = '\n\n'.join([page.page_content for page in pages])
+            if is_remote:
+                # Preload remote PDFs in one read instead of many small ranged reads
+                with _open_remote(file_path, 'rb') as f:
+                    data = f.read()
+                if fitz is not None:
+                    with fitz.open(stream=data, filetype="pdf") as doc:
+                        pages = [page.get_text("text") for page in doc]
+                else:
+                    from pypdf import PdfReader
+                    reader = PdfReader(io.BytesIO(data))
+                    pages = (page.extract_text() or '' for page in reader.pages)
+            else:
+                pages = _iter_pdf_pages(file_path, split_pages)
+            if cls._FAST_SPLITTER is not None:
+                # Chunk pages as they are extracted, the Rust splitter spreads each batch over all cores
+                chunks = list(cls._iter_page_chunks(pages))
+                logger.debug("PDF splitted into chunks...")
+            else:
+                # Stream pages into one buffer instead of holding the page list and a joined copy
+                buffer = io.StringIO()
+                for i, page_text in enumerate(pages):
+                    if i:
+                        buffer.write('\n\n')
+                    buffer.write(page_text)
+                chunks = cls._split_into_chunks(buffer.getvalue())
         else:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            
-        chunks = self._split_into_chunks(content)
-        self._store_chunks(chunks, doc_type, source or file_path)
+            if is_remote:
+                with _open_remote(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    content = f.read()
+            else:
+                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    content = f.read()
+            chunks = cls._split_into_chunks(content)
+
         return chunks
 
-    def _split_into_chunks(self, text: str, chunk_size: int = 1000) -> List[str]:
-        """Split text into manageable chunks using LangChain's RecursiveCharacterTextSplitter
+    @classmethod
+    def _iter_page_chunks(cls, pages: Iterable[str]) -> Iterator[str]:
+        """Yield chunks of a page stream in document order, never holding more than one
+        batch of page texts
+        """
+        pages = iter(pages)
+        while True:
+            batch = list(islice(pages, SPLIT_PAGE_BATCH))
+            if not batch:
+                return
+            for page_chunks in cls._FAST_SPLITTER.chunk_all(batch):
+                yield from page_chunks
+
+    @classmethod
+    def _split_into_chunks(cls, text: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[str]:
+        """Split text into manageable chunks with semantic-text-splitter if installed,
+        otherwise LangChain's RecursiveCharacterTextSplitter
         
         Args:
             text: The input text to be split
@@ -77,34 +297,97 @@ class DocumentProcessor:
         Returns:
             List of text chunks
         """
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=200,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        if chunk_size == cls.DEFAULT_CHUNK_SIZE and cls._FAST_SPLITTER is not None:
+            chunks = cls._FAST_SPLITTER.chunks(text)
+            logger.debug("PDF splitted into chunks...")
+            return chunks
+
+        text_splitter = cls._SPLITTER
+        if chunk_size != cls.DEFAULT_CHUNK_SIZE:
+            text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size,
+                chunk_overlap=200,
+                length_function=len,
+                separators=["\n\n", "\n", " ", ""]
+            )
         
         chunks = text_splitter.split_text(text)
-        print("PDF splitted into chunks...")
+        logger.debug("PDF splitted into chunks...")
         return chunks
 
     def _store_chunks(self, chunks: List[str], doc_type: DocumentType, source: str):
-        """Store document chunks in Snowflake"""
+        """Store the chunks of one document in Snowflake"""
+        self._store_sources({source: chunks}, doc_type)
+
+    def _store_sources(self, chunks_by_source: Dict[str, List[str]], doc_type: DocumentType):
+        """Store document chunks in Snowflake, only writing chunks whose content changed
+        
+        Chunks are keyed on (source, content hash): unchanged chunks of the given sources
+        are kept, new ones are merged in and everything else is removed, so re-ingesting
+        unchanged documents leaves the table (and the search service) untouched.
+        """
         table_name = f"{doc_type.value}_chunks"
+        staging_table = f"{table_name}_staging"
+        
+        # Deduplicate chunks per source and hash them (hex, converted back to BINARY on merge)
+        hashed_chunks = {}
+        for source, chunks in chunks_by_source.items():
+            for chunk in chunks:
+                hashed_chunks.setdefault((source, hash_bytes(chunk.encode('utf-8', 'ignore')).hex()), chunk)
+        
+        self.session.sql(f"""
+            CREATE OR REPLACE TEMPORARY TABLE {staging_table} (
+                doc_text STRING,
+                source STRING,
+                metadata STRING,
+                content_hash STRING
+            )
+        """).collect()
         
-        # Truncate the existing table
-        self.session.sql(f"TRUNCATE TABLE IF EXISTS {table_name}").collect()
-        print(f"Cleared existing data from {table_name}")
+        # Bulk load the staging table (Parquet PUT + COPY) instead of binding every value;
+        # snappy keeps the client-side Parquet encode cheap for large documents
+        if hashed_chunks:
+            n = len(hashed_chunks)
+            df = pd.DataFrame({
+                "DOC_TEXT": list(hashed_chunks.values()),
+                "SOURCE": [source for source, _ in hashed_chunks],
+                "METADATA": ['{}'] * n,
+                "CONTENT_HASH": [content_hash for _, content_hash in hashed_chunks]
+            })
+            self.session.write_pandas(
+                df,
+                staging_table.upper(),
+                auto_create_table=False,
+                overwrite=False,
+                quote_identifiers=False,
+                chunk_size=WRITE_CHUNK_ROWS,
+                compression="snappy",
+                parallel=WRITE_PARALLEL
+            )
         
-        # Batch insert chunks
-        values_list = [(chunk, source, '{}') for chunk in chunks]
-        placeholders = ", ".join(["(?, ?, ?)"] * len(values_list))
-        flattened_params = [param for value_tuple in values_list for param in value_tuple]
+        # Remove rows of other documents and chunks that no longer exist in these ones
+        self.session.sql(f"""
+            DELETE FROM {table_name} t
+            WHERE t.content_hash IS NULL
+                OR NOT EXISTS (
+                    SELECT 1 FROM {staging_table} s
+                    WHERE s.source = t.source AND TO_BINARY(s.content_hash, 'HEX') = t.content_hash
+                )
+        """).collect()
+        logger.debug("Cleared stale data from %s", table_name)
         
         self.session.sql(f"""
-            INSERT INTO {table_name} (doc_text, source, metadata)
-            SELECT column1, column2, PARSE_JSON(column3)
-            FROM VALUES {placeholders}
-        """, params=flattened_params).collect()
+            MERGE INTO {table_name} t
+            USING (
+                SELECT doc_text, source, PARSE_JSON(metadata) AS metadata, TO_BINARY(content_hash, 'HEX') AS content_hash
+                FROM {staging_table}
+            ) s
+            ON t.source = s.source AND t.content_hash = s.content_hash
+            WHEN NOT MATCHED THEN
+                INSERT (doc_text, source, metadata, content_hash)
+                VALUES (s.doc_text, s.source, s.metadata, s.content_hash)
+        """).collect()
         
-        print(f"Stored {len(chunks)} new chunks in {table_name}")
\ No newline at end of file
+        # Results cached before this ingest would keep serving the old corpus
+        search_cache.clear()
+        logger.debug("Stored %d chunks in %s", len(hashed_chunks), table_name)
@@ -0,0 +1,17 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to json
+    orjson = None
+
+def dumps(obj) -> str:
+    """Serialize to a JSON str (the Snowpark SQL binder expects str, not bytes)"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
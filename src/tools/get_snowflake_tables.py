@@ -3,6 +3,9 @@ from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
 from snowflake.snowpark.session import Session
 from config import MODEL_NAME
+import logging
+
+logger = logging.getLogger(__name__)
 
 class SnowflakeTableInput(BaseModel):
     """Input schema for table search."""
@@ -22,18 +25,18 @@ class SnowflakeTableTool(BaseTool):
     def _run(self, query: str) -> str:
         """Search for relevant tables and summarize with LLM."""
 
-        print(f"`SnowflakeTableTool` called with query input: {query}")
-        # Get tables info
-        tables_info = self._session.sql("""
+        logger.debug("`SnowflakeTableTool` called with query input: %s", query)
+        # Get tables info, issuing both catalog queries before waiting on either
+        tables_info_job = self._session.sql("""
             SELECT 
                 table_name,
                 table_type,
                 comment
             FROM information_schema.tables 
             WHERE table_schema = CURRENT_SCHEMA()
-        """).collect()
+        """).collect_nowait()
 
-        columns_info = self._session.sql("""
+        columns_info_job = self._session.sql("""
             SELECT 
                 table_name,
                 column_name,
@@ -43,7 +46,18 @@ class SnowflakeTableTool(BaseTool):
             FROM information_schema.columns
             WHERE table_schema = CURRENT_SCHEMA()
             ORDER BY table_name, ordinal_position
-        """).collect()
+        """).collect_nowait()
+
+        tables_info = tables_info_job.result()
+        columns_info = columns_info_job.result()
+
+        # Format and bucket column lines by table once instead of scanning all columns per table
+        column_lines = {}
+        for col in columns_info:
+            name, dtype, nullable, comment = col['COLUMN_NAME'], col['DATA_TYPE'], col['IS_NULLABLE'], col['COMMENT']
+            column_lines.setdefault(col['TABLE_NAME'], []).append(
+                f"- {name} ({dtype}){'[nullable]' if nullable == 'YES' else ''}: {comment if comment else 'No description'}"
+            )
 
         context_parts = []
         
@@ -51,15 +65,7 @@ class SnowflakeTableTool(BaseTool):
             table_name = table['TABLE_NAME']
             table_comment = table['COMMENT'] if table['COMMENT'] else 'No description available'
             
-            table_columns = [
-                col for col in columns_info 
-                if col['TABLE_NAME'] == table_name
-            ]
-            
-            columns_text = "\n".join([
-                f"- {col['COLUMN_NAME']} ({col['DATA_TYPE']}){'[nullable]' if col['IS_NULLABLE'] == 'YES' else ''}: {col['COMMENT'] if col['COMMENT'] else 'No description'}"
-                for col in table_columns
-            ])
+            columns_text = "\n".join(column_lines.get(table_name, ()))
             
             context_parts.append(f"""
             Table: {table_name}
@@ -92,6 +98,6 @@ class SnowflakeTableTool(BaseTool):
             params=(MODEL_NAME, prompt)
         ).collect()[0][0]
 
-        print("Snowflake Tool Response:", response)
+        logger.debug("Snowflake Tool Response: %s", response)
 
         return response
\ No newline at end of file
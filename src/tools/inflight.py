@@ -0,0 +1,40 @@
+from concurrent.futures import Future
+from threading import Lock
+from typing import Callable, Dict, Hashable, TypeVar
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_inflight: Dict[Hashable, Future] = {}
+_lock = Lock()
+
+def coalesce(key: Hashable, fn: Callable[[], T]) -> T:
+    """Run fn once for concurrent callers sharing the same key
+
+    The first caller runs fn; callers arriving while it is still in flight wait on
+    its result (or exception) instead of issuing a duplicate request. Nothing is
+    kept once the call finishes, so this is not a cache.
+    """
+    with _lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+
+    if not leader:
+        logger.debug("Joining in-flight request %r", key)
+        return future.result()
+
+    try:
+        result = fn()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
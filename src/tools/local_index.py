@@ -0,0 +1,104 @@
+from typing import Dict, List, Sequence
+import json
+import logging
+
+import numpy as np
+from snowflake.snowpark.session import Session
+from tools.semantic_cache import EMBED_MODEL
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per block, so an int8 index is only upcast to float32 a block at a time
+SCORE_BLOCK_ROWS = 4096
+
+class LocalExampleIndex:
+    """In-memory nearest-neighbour index over a fixed RAG example corpus
+
+    The matplotlib/sklearn example tables are small and rarely change, so their
+    embeddings are computed once (server side, with the same Cortex model used for
+    query embeddings) and searched locally with a matrix product instead of a
+    Cortex Search round trip per call.
+
+    Vectors may be stored as int8 (see quantize), which cuts resident index memory
+    4x; scoring still runs in float32, one block of rows at a time. A single scale
+    is used for all dimensions, so it does not change the ranking and scores are
+    compared without de-scaling.
+    """
+
+    def __init__(self, rows: List[Dict], vectors: np.ndarray):
+        self.rows = rows
+        self.vectors = vectors
+
+    @staticmethod
+    def quantize(vectors: np.ndarray) -> np.ndarray:
+        """Symmetric int8 scalar quantization of normalized float vectors"""
+        peak = float(np.abs(vectors).max()) if vectors.size else 0.0
+        scale = 127.0 / peak if peak else 1.0
+        return np.clip(np.rint(vectors * scale), -127, 127).astype(np.int8)
+
+    def search(self, query_embedding: np.ndarray, limit: int) -> List[Dict]:
+        """Return the rows closest to an L2-normalized query embedding"""
+        if not self.rows:
+            return []
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        scores = np.empty(len(self.rows), dtype=np.float32)
+        for start in range(0, len(self.rows), SCORE_BLOCK_ROWS):
+            block = self.vectors[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32, copy=False) @ query_embedding
+        limit = min(limit, len(self.rows))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        return [self.rows[i] for i in top[np.argsort(-scores[top])]]
+
+    def save(self, path: str) -> None:
+        # Written through a file handle, so np.savez does not append ".npz" to the name
+        with open(path, "wb") as f:
+            np.savez(f, vectors=self.vectors, rows=np.array(json.dumps(self.rows)))
+
+    @classmethod
+    def load(cls, path: str) -> "LocalExampleIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(json.loads(str(data["rows"])), data["vectors"])
+
+def build_local_index(
+    session: Session,
+    table: str,
+    embed_column: str,
+    columns: Sequence[str],
+    path: str = None,
+    quantize: bool = False
+) -> LocalExampleIndex:
+    """Embed every row of an example table in one query and build a local index
+
+    Args:
+        session: Snowflake session
+        table: Example table, e.g. plt_query_store
+        embed_column: Column (or SQL expression) whose text is embedded
+        columns: Columns (or `expr AS name`) returned with each hit, named like the
+            Cortex Search columns they replace
+        path: Optional file to persist the index to (loaded with LocalExampleIndex.load)
+        quantize: Store the corpus vectors as int8 instead of float32
+    """
+    rows = session.sql(f"""
+        SELECT {", ".join(columns)},
+            SNOWFLAKE.CORTEX.EMBED_TEXT_768('{EMBED_MODEL}', {embed_column}) AS embedding
+        FROM {table}
+    """).collect()
+
+    records = []
+    vectors = np.empty((len(rows), 768), dtype=np.float32)
+    for i, row in enumerate(rows):
+        record = row.as_dict()
+        vectors[i] = np.asarray(record.pop("EMBEDDING"), dtype=np.float32)
+        records.append({key.lower(): value for key, value in record.items()})
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms == 0, 1, norms)
+
+    if quantize:
+        vectors = LocalExampleIndex.quantize(vectors)
+
+    index = LocalExampleIndex(records, vectors)
+    if path:
+        index.save(path)
+    logger.debug("Built local index over %d rows of %s", len(records), table)
+    return index
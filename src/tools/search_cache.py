@@ -0,0 +1,94 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable, List, Optional, Sequence, Tuple
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class SearchResultCache:
+    """Thread-safe LRU cache with TTL for Cortex Search results
+
+    Agent loops tend to re-issue the same (or trivially different) queries while
+    iterating over tool calls, so results are cached per normalized query.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 86400):
+        """Initialize the cache
+
+        Args:
+            maxsize: Maximum number of cached searches
+            ttl: Seconds a cached result stays valid
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, List[dict]]]" = OrderedDict()
+        self._dependents: List[Any] = []
+        self._lock = Lock()
+
+    @staticmethod
+    def make_key(service_name: str, query: str, columns: Sequence[str], limit: int) -> Tuple:
+        return (service_name, query.strip().lower(), tuple(columns), limit)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key: Hashable) -> Optional[List[dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, results: List[dict]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def add_dependent(self, cache: Any) -> None:
+        """Clear another cache (e.g. answers built from these results) along with this one"""
+        self._dependents.append(cache)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        for cache in self._dependents:
+            cache.clear()
+
+    def search(self, search_service: Any, service_name: str, query: str,
+               columns: Sequence[str], limit: int) -> List[dict]:
+        """Return cached results for the search, querying Cortex Search on a miss
+
+        Args:
+            search_service: Resolved Cortex Search service handle
+            service_name: Name of the search service (part of the cache key)
+            query: Search query
+            columns: Columns to return
+            limit: Maximum number of results
+        """
+        key = self.make_key(service_name, query, columns, limit)
+        results = self.get(key)
+        if results is None:
+            response = search_service.search(query=query, columns=list(columns), limit=limit)
+            results = response.results if response.results else []
+            self.put(key, results)
+
+        logger.debug(
+            "Search cache %s: hits=%d misses=%d hit_rate=%.2f",
+            service_name, self.hits, self.misses, self.hit_rate
+        )
+        return results
+
+# Shared across tools so repeated queries from different agents hit the same entries
+search_cache = SearchResultCache()
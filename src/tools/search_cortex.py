@@ -1,10 +1,17 @@
 from snowflake.snowpark.session import Session
-from snowflake.core import Root
-from typing import List, Type, Optional
-from pydantic import BaseModel, Field
+from typing import Callable, ClassVar, List, Type, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from dataclasses import dataclass
 from crewai_tools.tools.base_tool import BaseTool
 from enum import Enum
-from config import MODEL_NAME
+import re
+from config import MODEL_NAME, SMALL_MODEL_NAME
+from tools.cortex_rest import CortexSearchServices, complete_stream
+from tools.search_cache import search_cache
+from tools.semantic_cache import SemanticCache, embed_text
+import logging
+
+logger = logging.getLogger(__name__)
 
 class TechStack(str, Enum):
     STREAMLIT = "streamlit"
@@ -15,16 +22,41 @@ class DocumentType(Enum):
     STREAMLIT_DOCS = "streamlit_code"
     ST_REF_DOCS = "streamlit_appgalery"
 
+_TECH_TO_SVC = {
+    TechStack.STREAMLIT: f"{DocumentType.STREAMLIT_DOCS.value}_search_svc",
+    TechStack.ST_REF: f"{DocumentType.ST_REF_DOCS.value}_search_svc",
+}
+_TECH_COLUMNS = ("doc_text",)
+
+# Schema examples are only attached when a JSON schema is generated, not to the
+# model classes validated on every tool call
+_EXAMPLES = {
+    "req_search_input": [{"query": "authentication flow", "doc_type": "requirements"}],
+    "search_input": [
+        {
+            "query": "authentication flow", 
+            "tech_stack": "streamlit",
+            "doc_type": "technical_docs",
+            "prev_context": "Initial OAuth implementation in streamlit... ```python  st.session_state ... ```"
+        }
+    ],
+    "search_output": [{
+        "context": "Combined document context",
+        "response": "LLM-generated answer"
+    }],
+}
+
+def _schema_examples(name: str):
+    def add_examples(schema: dict) -> None:
+        schema["examples"] = _EXAMPLES[name]
+    return add_examples
+
 class ReqSearchInput(BaseModel):
     """Input schema for document search."""
     query: str = Field(description="The search query to use")
     doc_type: str = Field(description="Type of document to search ('requirements')")
 
-    model_config = {
-        "json_schema_extra": {
-            "examples": [{"query": "authentication flow", "doc_type": "requirements"}]
-        }
-    }
+    model_config = ConfigDict(json_schema_extra=_schema_examples("req_search_input"))
 
 class SearchInput(BaseModel):
     """Input schema for document search."""
@@ -35,109 +67,180 @@ class SearchInput(BaseModel):
     doc_type: str = Field(description="Type of document to search ('requirements' or 'technical_docs')")
     prev_context: Optional[str] = Field(description="Context from previous task, to learn or improve")
 
-    model_config = {
-        "json_schema_extra": {
-            "examples": [
-                {
-                    "query": "authentication flow", 
-                    "tech_stack": "streamlit",
-                    "doc_type": "technical_docs",
-                    "prev_context": "Initial OAuth implementation in streamlit... ```python  st.session_state ... ```"
-                }
-            ]
-        }
-    }
-
-class SearchResult(BaseModel):
-    """Schema for a single search result."""
-    doc_text: str = Field(description="The text content of the document")
-    source: str = Field(description="Source/origin of the document")
+    model_config = ConfigDict(json_schema_extra=_schema_examples("search_input"))
 
-    model_config = {
-        "json_schema_extra": {
-            "examples": [{"doc_text": "Sample document text", "source": "requirements.txt"}]
-        }
-    }
+@dataclass(slots=True)
+class SearchResult:
+    """A single search result."""
+    doc_text: str
+    source: str
 
 class SearchOutput(BaseModel):
     """Output schema for document search with LLM processing."""
     context: str = Field(description="Combined search results context")
     response: str = Field(description="LLM-generated response based on the context")
 
-    model_config = {
-        "json_schema_extra": {
-            "examples": [{
-                "context": "Combined document context",
-                "response": "LLM-generated answer"
-            }]
-        }
-    }
+    model_config = ConfigDict(json_schema_extra=_schema_examples("search_output"))
+
+REQUIREMENTS_SYSTEM_PROMPT = """Based on the provided context, extract and analyze the key technical requirements (for MVP).
+Make it short and clear in less than 50 words. If possible, generate a template streamlit app to fulfil the requirement.
+
+Technical Requirements Analysis:
+- Identify all Python-implementable components
+- List required data sources and processing needs
+- Specify required Streamlit UI components
+- Note any performance or scalability requirements
+
+FORMAT YOUR RESPONSE AS:
+1. Technical Requirements: [List each requirement]
+2. Data Requirements: [List data needs]
+3. UI Components: [List Streamlit elements]
+4. Integration Needs: [List dependencies]
+5. Constraints: [List any limitations]"""
+
+MODEL_ROUTE = {"small": SMALL_MODEL_NAME, "large": MODEL_NAME}
+
+# Responses from the small model that look like this are retried on the large one
+LOW_CONFIDENCE_MARKERS = ("i don't know", "i do not know", "not sure", "cannot determine", "insufficient")
+
+# Explanatory questions go to the large model; whole words only, so "show" or "however" don't count
+_EXPLAIN_RE = re.compile(r"\b(how|why)\b")
+
+def _route_model(query: str, context: str) -> str:
+    """Pick the small model for simple extraction queries, the large one otherwise"""
+    lowered = query.lower()
+    score = len(query.split()) + (2 if _EXPLAIN_RE.search(lowered) else 0) + len(context) // 4000
+    return "small" if score < 6 else "large"
+
+def _needs_escalation(response: str) -> bool:
+    lowered = response.lower()
+    return len(response.split()) < 20 or any(marker in lowered for marker in LOW_CONFIDENCE_MARKERS)
+
+_BLANK_LINES_RE = re.compile(r"[ \t]*\n(?:[ \t]*\n)+")
+
+def _compact(text: str) -> str:
+    """Collapse runs of blank lines and surrounding whitespace to save prompt tokens"""
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+# Context budget for retrieved documents, estimated at ~4 characters per token
+CONTEXT_TOKEN_BUDGET = 2000
+CHARS_PER_TOKEN = 4
+DUPLICATE_JACCARD = 0.8
+
+def _shingles(text: str, n: int = 5) -> set:
+    words = text.lower().split()
+    if len(words) <= n:
+        return {tuple(words)}
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+def _dedup_and_cap(results: List[dict], token_budget: int = CONTEXT_TOKEN_BUDGET) -> List[dict]:
+    """Drop near-duplicate results and trim the survivors to the token budget
+    
+    A result is a duplicate when its 5-word shingles overlap an earlier kept result
+    with Jaccard similarity above DUPLICATE_JACCARD. The result that crosses the
+    budget is truncated and everything after it is dropped.
+    """
+    kept, kept_shingles = [], []
+    remaining = token_budget * CHARS_PER_TOKEN
+    for r in results:
+        if remaining <= 0:
+            break
+        shingles = _shingles(r['doc_text'])
+        if any(len(shingles & other) / len(shingles | other) > DUPLICATE_JACCARD for other in kept_shingles):
+            continue
+        kept_shingles.append(shingles)
+        if len(r['doc_text']) > remaining:
+            r = {**r, 'doc_text': r['doc_text'][:remaining]}
+        remaining -= len(r['doc_text'])
+        kept.append(r)
+    return kept
+
+# Shared by both tools, namespaced by the inputs (besides the query) that shape the response;
+# answers are built from search results, so they are dropped whenever those are
+semantic_cache = SemanticCache()
+search_cache.add_dependent(semantic_cache)
 
 class CortexSearchRequirementsTool(BaseTool):
     name: str = "Search Requirements Documents"
     description: str = "Search through business requirements and get LLM-processed answers"
     args_schema: Type[BaseModel] = ReqSearchInput
     return_schema: Type[BaseModel] = SearchOutput
+    _PROMPT_TPL: ClassVar[str] = "Context:\n{context}\n\nQuestion: {query}"
+    _SVC_NAME: ClassVar[str] = f"{DocumentType.REQUIREMENTS.value}_search_svc"
     
-    def __init__(self, snowpark_session: Session, result_as_answer: bool = False):
+    def __init__(
+        self,
+        snowpark_session: Session,
+        result_as_answer: bool = False,
+        on_token: Optional[Callable[[str], None]] = None
+    ):
         super().__init__()
         self._session = snowpark_session
-        self._root = Root(self._session)
+        self._on_token = on_token
+        self._search_services = CortexSearchServices(self._session)
         self.result_as_answer = result_as_answer
 
     def _run(self, query: str, doc_type: str = "requirements") -> SearchOutput:
         """Run the search and process results with LLM."""
         
-        print(f"`CortexSearchRequirementsTool` called with query: {query}, doc_type: {doc_type}")
-
-        service_name = f"{DocumentType.REQUIREMENTS.value}_search_svc"
-        search_service = (
-            self._root
-            .databases[self._session.get_current_database()]
-            .schemas[self._session.get_current_schema()]
-            .cortex_search_services[service_name]
-        )
+        logger.debug("`CortexSearchRequirementsTool` called with query: %s, doc_type: %s", query, doc_type)
+
+        cache_namespace = ("requirements", doc_type)
+        cached = semantic_cache.get_exact(cache_namespace, query)
+        if cached is not None:
+            return cached
+        query_embedding = embed_text(self._session, query)
+        cached = semantic_cache.lookup(cache_namespace, query, query_embedding)
+        if cached is not None:
+            return cached
+
+        service_name = self._SVC_NAME
+        search_service = self._search_services.get(service_name)
         
-        results = search_service.search(
+        results = search_cache.search(
+            search_service,
+            service_name,
             query=query,
             columns=["doc_text", "source"],
             limit=5
         )
         
+        results = _dedup_and_cap(results)
+        
+        # Skip the source line when the chunk already cites its source
         context = "\n\n".join([
-            f"Source: {r['source']}\nContent: {r['doc_text']}"
-            for r in results.results
+            _compact(r['doc_text']) if r['source'] in r['doc_text']
+            else f"Source: {r['source']}\n{_compact(r['doc_text'])}"
+            for r in results
         ])
         
-        prompt = f"""
-        Based on the following context, extract and analyze the key technical requirements (for MVP).
-        Make it short and clear in less than 50 words. If possible, generate a template streamlit app to fulfil the requirement.
-
-        Context:
-        {context}
-
-        Question: {query}
-
-        Technical Requirements Analysis:
-        - Identify all Python-implementable components
-        - List required data sources and processing needs
-        - Specify required Streamlit UI components
-        - Note any performance or scalability requirements
-
-        FORMAT YOUR RESPONSE AS:
-        1. Technical Requirements: [List each requirement]
-        2. Data Requirements: [List data needs]
-        3. UI Components: [List Streamlit elements]
-        4. Integration Needs: [List dependencies]
-        5. Constraints: [List any limitations]
-        """
+        prompt = self._PROMPT_TPL.format(context=context, query=query)
         
-        response = self._session.sql(
-            "SELECT snowflake.cortex.complete(?, ?)",
-            params=(MODEL_NAME, prompt)
-        ).collect()[0][0]
+        response = None
+        if _route_model(query, context) == "small":
+            # Not streamed: the answer may still be replaced by the large model
+            response = complete_stream(
+                self._session,
+                MODEL_ROUTE["small"],
+                prompt,
+                system=REQUIREMENTS_SYSTEM_PROMPT
+            )
+            if _needs_escalation(response):
+                response = None
+            elif self._on_token:
+                self._on_token(response)
 
-        print("Requirement Tool Response:", response)
+        if response is None:
+            response = complete_stream(
+                self._session,
+                MODEL_ROUTE["large"],
+                prompt,
+                on_token=self._on_token,
+                system=REQUIREMENTS_SYSTEM_PROMPT
+            )
+
+        logger.debug("Requirement Tool Response: %s", response)
+        semantic_cache.store(cache_namespace, query, query_embedding, response)
 
         return response
 
@@ -146,57 +249,66 @@ class CortexSearchTechnicalTool(BaseTool):
     description: str = """Search through technical documentation and get implementation guidance."""
     args_schema: Type[BaseModel] = SearchInput
     return_schema: Type[BaseModel] = SearchOutput
+    _PROMPT_TPL: ClassVar[str] = (
+        "Use the following {tech_stack} documentation as guidance, provide code implementation guidance.\n"
+        "Documentation:\n{context}\n\nQuestion: {query}"
+    )
 
-    def __init__(self, snowpark_session: Session, result_as_answer: bool = False):
+    def __init__(
+        self,
+        snowpark_session: Session,
+        result_as_answer: bool = False,
+        on_token: Optional[Callable[[str], None]] = None
+    ):
         super().__init__()
         self._session = snowpark_session
-        self._root = Root(self._session)
+        self._on_token = on_token
+        self._search_services = CortexSearchServices(self._session)
         self.result_as_answer = result_as_answer
 
     def _run(self, query: str, tech_stack: str, doc_type: str = "technical_docs", prev_context: Optional[str] = None) -> SearchOutput:
         """Run the search and process results with LLM."""
 
-        print(f"`CortexSearchTechnicalTool` called with query: {query}, doc_type: {doc_type}, tech_stack: {tech_stack}")
+        logger.debug("`CortexSearchTechnicalTool` called with query: %s, doc_type: %s, tech_stack: %s", query, doc_type, tech_stack)
 
-        if tech_stack == TechStack.STREAMLIT:
-            service_name = f"{DocumentType.STREAMLIT_DOCS.value}_search_svc"
-        elif tech_stack == TechStack.ST_REF:
-            service_name = f"{DocumentType.ST_REF_DOCS.value}_search_svc"
-        else:
+        try:
+            service_name = _TECH_TO_SVC[TechStack(tech_stack)]
+        except (KeyError, ValueError):
             raise ValueError("tech_stack must be specified as either 'streamlit' or 'st_ref'")
+
+        # prev_context is not part of the prompt, so it does not shape the response
+        cache_namespace = ("technical", service_name)
+        cached = semantic_cache.get_exact(cache_namespace, query)
+        if cached is not None:
+            return cached
+        query_embedding = embed_text(self._session, query)
+        cached = semantic_cache.lookup(cache_namespace, query, query_embedding)
+        if cached is not None:
+            return cached
             
-        search_service = (
-            self._root
-            .databases[self._session.get_current_database()]
-            .schemas[self._session.get_current_schema()]
-            .cortex_search_services[service_name]
-        )
+        search_service = self._search_services.get(service_name)
         
-        results = search_service.search(
+        results = search_cache.search(
+            search_service,
+            service_name,
             query=query,
-            columns=["doc_text"],
+            columns=_TECH_COLUMNS,
             limit=5
         )
         
+        results = _dedup_and_cap(results)
+        
         context = "\n\n".join([
             f"Content: {r['doc_text']}"
-            for r in results.results
+            for r in results
         ])
         
-        prompt = f"""
-        Use the following {tech_stack} documentation as guidance, provide code implementation guidance.
-        Documentation:
-        {context}
-
-        Question: {query}
-        """
+        prompt = self._PROMPT_TPL.format(tech_stack=tech_stack, context=context, query=query)
         
-        response = self._session.sql(
-            "SELECT snowflake.cortex.complete(?, ?)",
-            params=(MODEL_NAME, prompt)
-        ).collect()[0][0]
+        response = complete_stream(self._session, MODEL_NAME, prompt, on_token=self._on_token)
 
-        print("Technical Tool Response:", response)
+        logger.debug("Technical Tool Response: %s", response)
+        semantic_cache.store(cache_namespace, query, query_embedding, response)
 
         return response
 
@@ -0,0 +1,162 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Hashable, List, Optional
+import hashlib
+import logging
+import re
+
+import numpy as np
+from snowflake.snowpark.session import Session
+from tools.inflight import coalesce
+
+logger = logging.getLogger(__name__)
+
+EMBED_MODEL = "e5-base-v2"
+
+_WORD_RE = re.compile(r"\w+")
+
+EMBED_CACHE_SIZE = 2048
+
+_embeddings: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_embeddings_lock = Lock()
+
+def embed_text(session: Session, text: str) -> np.ndarray:
+    """Embed text with Cortex EMBED_TEXT_768 and L2-normalize it
+
+    Embeddings are memoized, and concurrent requests for the same text share one
+    call, so a query fanned out to several tools (or cache layers) is embedded once.
+    The returned array is read-only.
+    """
+    with _embeddings_lock:
+        vector = _embeddings.get(text)
+        if vector is not None:
+            _embeddings.move_to_end(text)
+            return vector
+
+    vector = coalesce(("embed", EMBED_MODEL, text), lambda: _embed_remote(session, text))
+    with _embeddings_lock:
+        _embeddings[text] = vector
+        if len(_embeddings) > EMBED_CACHE_SIZE:
+            _embeddings.popitem(last=False)
+    return vector
+
+def _embed_remote(session: Session, text: str) -> np.ndarray:
+    vector = session.sql(
+        "SELECT snowflake.cortex.embed_text_768(?, ?)",
+        params=[EMBED_MODEL, text]
+    ).collect()[0][0]
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    vector = vector / norm if norm else vector
+    vector.flags.writeable = False
+    return vector
+
+def _tokens(text: str) -> set:
+    return set(_WORD_RE.findall(text.lower()))
+
+class _Namespace:
+    def __init__(self, dim: int):
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.texts: List[str] = []
+        self.responses: List[str] = []
+
+def context_key(context: str) -> str:
+    """Short stable digest of a (possibly large) context, for use in cache namespaces"""
+    return hashlib.blake2b(context.encode(), digest_size=16).hexdigest()
+
+class SemanticCache:
+    """In-process semantic cache for LLM responses
+
+    Lookups are two-stage: exact text match first, then nearest neighbour by cosine
+    similarity over normalized embeddings. A neighbour above the threshold must also
+    pass a cheap lexical judge (word overlap) before it is served, so queries that
+    embed closely but ask for different things still miss.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        min_overlap: float = 0.5,
+        maxsize: int = 1024,
+        max_namespaces: int = 64
+    ):
+        """Initialize the cache
+
+        Args:
+            threshold: Minimum cosine similarity for a semantic hit
+            min_overlap: Minimum word-set Jaccard overlap for the judge to accept a hit
+            maxsize: Maximum entries kept per namespace (oldest evicted first)
+            max_namespaces: Maximum namespaces kept (least recently used evicted first)
+        """
+        self.threshold = threshold
+        self.min_overlap = min_overlap
+        self.maxsize = maxsize
+        self.max_namespaces = max_namespaces
+        self.hits = 0
+        self.misses = 0
+        self._exact: "OrderedDict[Hashable, OrderedDict[str, str]]" = OrderedDict()
+        self._namespaces: "OrderedDict[Hashable, _Namespace]" = OrderedDict()
+        self._lock = Lock()
+
+    def _touch(self, namespace: Hashable) -> None:
+        """Mark a namespace as recently used; caller holds the lock"""
+        if namespace in self._exact:
+            self._exact.move_to_end(namespace)
+        if namespace in self._namespaces:
+            self._namespaces.move_to_end(namespace)
+
+    def get_exact(self, namespace: Hashable, text: str) -> Optional[str]:
+        """Return a cached response for exactly this text, without embedding it"""
+        with self._lock:
+            self._touch(namespace)
+            response = self._exact.get(namespace, {}).get(text)
+            if response is not None:
+                self.hits += 1
+            return response
+
+    def lookup(self, namespace: Hashable, text: str, embedding: np.ndarray) -> Optional[str]:
+        """Return the cached response of the closest equivalent text, if any"""
+        with self._lock:
+            self._touch(namespace)
+            ns = self._namespaces.get(namespace)
+            if ns is not None and ns.texts:
+                scores = ns.vectors @ embedding
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold and self._judge(text, ns.texts[best]):
+                    self.hits += 1
+                    logger.debug("Semantic cache hit (%.3f): %r ~ %r", scores[best], text, ns.texts[best])
+                    return ns.responses[best]
+            self.misses += 1
+            return None
+
+    def store(self, namespace: Hashable, text: str, embedding: np.ndarray, response: str) -> None:
+        with self._lock:
+            exact = self._exact.setdefault(namespace, OrderedDict())
+            exact[text] = response
+            if len(exact) > self.maxsize:
+                exact.popitem(last=False)
+
+            ns = self._namespaces.get(namespace)
+            if ns is None:
+                ns = self._namespaces[namespace] = _Namespace(embedding.shape[0])
+            # Explicit start index: a negative one becomes [-0:] (keep all) when maxsize is 1
+            keep_from = max(len(ns.texts) - self.maxsize + 1, 0)
+            ns.vectors = np.vstack([ns.vectors[keep_from:], embedding[None, :]])
+            ns.texts = ns.texts[keep_from:] + [text]
+            ns.responses = ns.responses[keep_from:] + [response]
+
+            self._touch(namespace)
+            while len(self._namespaces) > self.max_namespaces:
+                evicted, _ = self._namespaces.popitem(last=False)
+                self._exact.pop(evicted, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._exact.clear()
+            self._namespaces.clear()
+
+    def _judge(self, text: str, cached_text: str) -> bool:
+        a, b = _tokens(text), _tokens(cached_text)
+        if not a or not b:
+            return a == b
+        return len(a & b) / len(a | b) >= self.min_overlap
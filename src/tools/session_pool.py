@@ -0,0 +1,141 @@
+from contextlib import contextmanager
+from queue import Empty, Full, Queue
+from threading import Lock
+from typing import Dict, Iterator, List, Optional
+import atexit
+import logging
+
+from snowflake.snowpark.session import Session
+from config import CONNECTION_PARAMETER
+
+logger = logging.getLogger(__name__)
+
+class SessionPool:
+    """Bounded pool of Snowpark sessions
+
+    A Snowpark session runs one statement at a time, so tool calls that share a
+    session queue behind each other. The pool hands each caller its own session,
+    opening new ones on demand up to max_size and blocking once all are in use.
+    Every session it opens, borrowed or idle, is closed by close(), which also runs
+    at interpreter exit.
+    """
+
+    def __init__(
+        self,
+        connection_parameters: Optional[Dict] = None,
+        min_size: int = 4,
+        max_size: int = 16,
+        timeout: Optional[float] = None
+    ):
+        """Initialize the pool
+
+        Args:
+            connection_parameters: Snowpark connection parameters, defaults to CONNECTION_PARAMETER
+            min_size: Sessions opened up front
+            max_size: Maximum number of open sessions
+            timeout: Seconds to wait for a free session before raising queue.Empty
+        """
+        self._params = {
+            **(connection_parameters or CONNECTION_PARAMETER),
+            "client_session_keep_alive": True
+        }
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle: "Queue[Session]" = Queue(maxsize=max_size)
+        self._created = 0
+        self._sessions: List[Session] = []
+        self._closed = False
+        self._lock = Lock()
+        atexit.register(self.close)
+        for _ in range(min(min_size, max_size)):
+            self._created += 1
+            self._idle.put(self._create())
+
+    def _create(self) -> Session:
+        logger.debug("Opening pooled Snowpark session %d/%d", self._created, self.max_size)
+        session = Session.builder.configs(self._params).create()
+        with self._lock:
+            self._sessions.append(session)
+        return session
+
+    def acquire(self) -> Session:
+        if self._closed:
+            raise RuntimeError("Session pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+        with self._lock:
+            # Reserve the slot under the lock so concurrent callers cannot overshoot
+            can_grow = self._created < self.max_size
+            if can_grow:
+                self._created += 1
+        if can_grow:
+            try:
+                return self._create()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get(timeout=self.timeout)
+
+    def release(self, session: Session) -> None:
+        if self._closed:
+            # Already closed along with the pool
+            return
+        try:
+            self._idle.put_nowait(session)
+        except Full:
+            with self._lock:
+                self._sessions.remove(session)
+                self._created -= 1
+            session.close()
+
+    @contextmanager
+    def session(self) -> Iterator[Session]:
+        """Borrow a session for the duration of the block"""
+        session = self.acquire()
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    def close(self) -> None:
+        """Close every session the pool opened, including ones still borrowed"""
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait()
+            except Empty:
+                break
+        for session in sessions:
+            try:
+                session.close()
+            except Exception as e:
+                logger.warning("Failed to close pooled Snowpark session: %s", e)
+
+@contextmanager
+def borrow(pool: Optional[SessionPool], session: Session) -> Iterator[Session]:
+    """Yield a pooled session if a pool is given, otherwise the caller's own session"""
+    if pool is None:
+        yield session
+        return
+    with pool.session() as pooled:
+        yield pooled
+
+_default_pool: Optional[SessionPool] = None
+_default_pool_lock = Lock()
+
+def get_session_pool() -> SessionPool:
+    """Process-wide pool shared by every tool instance
+    
+    Opens no sessions up front: the first borrow opens one, so flows that never use
+    the pool pay nothing for it.
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = SessionPool(min_size=0)
+        return _default_pool
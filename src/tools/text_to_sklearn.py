@@ -3,8 +3,21 @@ from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
 from snowflake.snowpark.session import Session
 from config import MODEL_NAME, MODEL_TEMPERATURE
-from snowflake.core import Root
-import json
+import hashlib
+import re
+import httpx
+import numpy as np
+from tools import fast_json
+from tools.cortex_rest import CortexSearchServices
+from tools.inflight import coalesce
+from tools.local_index import LocalExampleIndex, build_local_index
+from tools.search_cache import search_cache
+from tools.semantic_cache import SemanticCache, context_key, embed_text
+from tools.session_pool import SessionPool, borrow
+from tools.tool_guards import answer_on_error, guard_tool
+import logging
+
+logger = logging.getLogger(__name__)
 
 class SklearnInput(BaseModel):
     """Input schema for Python sklearn implementation code generation."""
@@ -14,70 +27,138 @@ class SklearnInput(BaseModel):
         description="Context about available data/columns"
     )
 
+# Generated code is reused for the same (or a paraphrased) task on the same data context;
+# one namespace per (model, data context digest), least recently used contexts evicted
+semantic_cache = SemanticCache(max_namespaces=32)
+
+# First fenced code block in the model output, which may be wrapped in prose
+_FENCE_RE = re.compile(r"```(?:python)?\s*\n(.*?)```", re.S)
+
+# Characters of an example's input shown in the prompt
+INPUT_PREVIEW_CHARS = 200
+
+def _input_preview(text: str) -> str:
+    return text[:INPUT_PREVIEW_CHARS] + '...' if len(text) > INPUT_PREVIEW_CHARS else text
+
 class RAGSklearnGenerator:
-    def __init__(self, session: Session, model_name: str = MODEL_NAME, num_examples: int = 3):
+    _PROMPT_HEADER = """[INST]
+        As an expert Python programmer, generate sklearn implementation code for the following task:
+
+        Task: {question}
+
+        Available Data Context:
+        {data_context}
+
+        Here are some similar examples to help guide you:
+        """
+    _EXAMPLE_TPL = """Example {i}:
+            Task: {task}
+            Python Code:
+            ```python
+            {code}```
+            """
+    _PROMPT_FOOTER = """
+        Based on these examples and the available data context, generate Python sklearn code for the original task:
+        {question}
+
+        Output only the Python code without any explanation or additional text.
+        [/INST]"""
+
+    def __init__(
+        self,
+        session: Session,
+        model_name: str = MODEL_NAME,
+        num_examples: int = 3,
+        pool: Optional[SessionPool] = None,
+        local_index: Optional[LocalExampleIndex] = None
+    ):
         """Initialize the RAG Python generator
         
         Args:
             session: Snowflake session
             model_name: Name of the Cortex model to use
             num_examples: Number of examples to retrieve
+            pool: Optional session pool, so concurrent generations don't queue on `session`
+            local_index: Optional prebuilt index of the example corpus, replaces Cortex Search
         """
         self.session = session
-        self.root = Root(session)
+        self.pool = pool
+        self._search_services = CortexSearchServices(session)
         self.model_name = model_name
         self.num_examples = num_examples
+        self.local_index = local_index
+        # Cleared once the search service turns out to predate its input_preview column
+        self._has_input_preview = True
+
+    @staticmethod
+    def build_example_index(session: Session, path: str = None, quantize: bool = False) -> LocalExampleIndex:
+        """Embed the example corpus once for local retrieval (see LocalExampleIndex)"""
+        return build_local_index(
+            session,
+            "sklearn_query_store",
+            "input",
+            [
+                "IFF(LENGTH(input) > 200, SUBSTR(input, 1, 200) || '...', input) AS input_preview",
+                "output",
+                "instruction"
+            ],
+            path,
+            quantize
+        )
 
-    def retrieve_examples(self, query: str) -> List[Dict]:
-        """Retrieve similar examples from Cortex Search
+    def retrieve_examples(self, query: str, query_embedding: Optional[np.ndarray] = None) -> List[Dict]:
+        """Retrieve similar examples from the local index if one is loaded, else Cortex Search
         
         Args:
             query: Natural language query
+            query_embedding: Normalized embedding of the query, computed if not given
         """
-        search_service = (
-            self.root
-            .databases[self.session.get_current_database()]
-            .schemas[self.session.get_current_schema()]
-            .cortex_search_services['sklearn_code_search_svc']
-        )
-
-        response = search_service.search(
+        if self.local_index is not None:
+            if query_embedding is None:
+                with borrow(self.pool, self.session) as session:
+                    query_embedding = embed_text(session, query)
+            return self.local_index.search(query_embedding, self.num_examples)
+
+        search_service = self._search_services.get('sklearn_code_search_svc')
+
+        if self._has_input_preview:
+            try:
+                return search_cache.search(
+                    search_service,
+                    'sklearn_code_search_svc',
+                    query=query,
+                    columns=["input_preview", "output", "instruction"],
+                    limit=self.num_examples
+                )
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 400:
+                    raise
+                logger.warning(
+                    "sklearn_code_search_svc rejected the input_preview column (%s), "
+                    "truncating the full input instead; re-create the service to serve it", e
+                )
+                self._has_input_preview = False
+
+        results = search_cache.search(
+            search_service,
+            'sklearn_code_search_svc',
             query=query,
             columns=["input", "output", "instruction"],
             limit=self.num_examples
         )
-        return response.results if response.results else []
+        return [{**r, 'input_preview': _input_preview(r['input'])} for r in results]
 
     def create_prompt(self, question: str, examples: List[Dict], data_context: str = "") -> str:
         """Create prompt for Python code generation"""
-        prompt_text = f"""[INST]
-        As an expert Python programmer, generate sklearn implementation code for the following task:
-
-        Task: {question}
-
-        Available Data Context:
-        {data_context}
-
-        Here are some similar examples to help guide you:
-        """
-
+        parts = [self._PROMPT_HEADER.format(question=question, data_context=data_context)]
         for i, example in enumerate(examples, 1):
-            prompt_text += f"""Example {i}:
-            Task: {example['input'][:200] + '...' if len(example['input']) > 200 else example['input']}
-            Python Code:
-            ```python
-            {example['output']}```
-            """
-
-        prompt_text += f"""
-        Based on these examples and the available data context, generate Python sklearn code for the original task:
-        {question}
-
-        Output only the Python code without any explanation or additional text.
-        [/INST]"""
-
-
-        return prompt_text
+            parts.append(self._EXAMPLE_TPL.format(
+                i=i,
+                task=example['input_preview'],
+                code=example['output']
+            ))
+        parts.append(self._PROMPT_FOOTER.format(question=question))
+        return ''.join(parts)
 
     def run_cortex_complete(self, prompt: str) -> str:
         """Run Cortex Complete model
@@ -85,7 +166,12 @@ class RAGSklearnGenerator:
         Args:
             prompt: Input prompt for the model
         """
-        messages = json.dumps([
+        # Identical prompts issued concurrently (retries, parallel crews) share one call
+        key = ("sklearn", self.model_name, hashlib.blake2b(prompt.encode(), digest_size=16).hexdigest())
+        return coalesce(key, lambda: self._run_cortex_complete(prompt))
+
+    def _run_cortex_complete(self, prompt: str) -> str:
+        messages = fast_json.dumps([
             {
                 'role': 'system', 
                 'content': 'You are a helpful AI assistant to implement scikit-learn in python using user specified data, dont use provided implementation example as it is but adapt it into user data to generate new sklearn implementation'
@@ -96,16 +182,17 @@ class RAGSklearnGenerator:
             }
         ])
 
-        parameters = json.dumps({                               
+        parameters = fast_json.dumps({                               
             'temperature': MODEL_TEMPERATURE,
         })
         
-        result = self.session.sql(
-            "SELECT snowflake.cortex.complete(?, parse_json(?), parse_json(?))",
-            params=[self.model_name, messages, parameters]
-        ).collect()[0][0]
+        with borrow(self.pool, self.session) as session:
+            result = session.sql(
+                "SELECT snowflake.cortex.complete(?, parse_json(?), parse_json(?))",
+                params=[self.model_name, messages, parameters]
+            ).collect()[0][0]
 
-        response = json.loads(result)
+        response = fast_json.loads(result)
         
         # Extract just the messages content from the first choice
         if response and 'choices' in response and len(response['choices']) > 0:
@@ -118,12 +205,31 @@ class RAGSklearnGenerator:
             question: Natural language question
             data_context: Data context information
         """
-        examples = self.retrieve_examples(question)
+        cache_namespace = ("sklearn", self.model_name, context_key(data_context))
+        cached = semantic_cache.get_exact(cache_namespace, question)
+        question_embedding = None
+        if cached is None:
+            with borrow(self.pool, self.session) as session:
+                question_embedding = embed_text(session, question)
+            cached = semantic_cache.lookup(cache_namespace, question, question_embedding)
+        if cached is not None:
+            return {
+                'question': question,
+                'data_context': data_context,
+                'generated_code': cached,
+                'examples_used': [],
+                'prompt_used': None
+            }
+
+        examples = self.retrieve_examples(question, question_embedding)
         prompt = self.create_prompt(question, examples)
         generated_code = self.run_cortex_complete(prompt).strip()
         
-        if generated_code.startswith("```python"):
-            generated_code = generated_code.replace("```python", "").replace("```", "").strip()
+        fenced = _FENCE_RE.search(generated_code)
+        if fenced:
+            generated_code = fenced.group(1).strip()
+        
+        semantic_cache.store(cache_namespace, question, question_embedding, generated_code)
         
         return {
             'question': question,
@@ -169,37 +275,28 @@ class SklearnImplementationTool(BaseTool):
         if len(prompt.split()) < 3:
             raise ValueError("Prompt is too short. Please provide a more detailed description")
 
+    @guard_tool("Error generating code")
     def _run(self, prompt: str, data_context: str = "") -> str:
         """Generate sklearn implementation code"""
-        try:
-            print(f"SklearnImplementationTool executing with prompt: {prompt}")
-            print(f"Data context: {data_context}")
+        logger.debug("SklearnImplementationTool executing with prompt: %s", prompt)
+        logger.debug("Data context: %s", data_context)
 
-            self.validate_input(prompt, data_context)
+        self.validate_input(prompt, data_context)
 
-            result = self._rag_generator.generate_python(
-                question=prompt,
-                data_context=data_context
-            )
-
-            return self.format_output(
-                code=result['generated_code'],
-                data_context=data_context
-            )
+        result = self._rag_generator.generate_python(
+            question=prompt,
+            data_context=data_context
+        )
 
-        except Exception as e:
-            error_message = f"Error generating code: {str(e)}"
-            print(error_message)
-            raise RuntimeError(error_message)
+        return self.format_output(
+            code=result['generated_code'],
+            data_context=data_context
+        )
 
+    @answer_on_error("Failed to generate code")
     def run(self, prompt: str, data_context: str = "") -> str:
         """Public method to run the tool with error handling"""
-        try:
-            return self._run(prompt, data_context)
-        except Exception as e:
-            if self.result_as_answer:
-                return f"Failed to generate code: {str(e)}"
-            raise
+        return self._run(prompt, data_context)
 
 # # USAGE
 # from snowflake.snowpark.session import Session
@@ -1,18 +1,166 @@
-from typing import Type, Dict, Optional, List
+from typing import ClassVar, Type, Dict, Optional, List, Set, Tuple, Union
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
 from snowflake.snowpark.session import Session
 from config import MODEL_NAME, MODEL_TEMPERATURE
-from dataclasses import dataclass
-from snowflake.core import Root
+from dataclasses import dataclass, field
 import json
+import logging
+import re
+import time
+from tools.semantic_cache import SemanticCache, context_key, embed_text
+from tools.cortex_rest import CortexSearchServices
+from tools.session_pool import SessionPool, borrow
+
+logger = logging.getLogger(__name__)
+
+# Seconds a fetched table catalog (and its formatted context) is reused
+CATALOG_TTL = 300
+
+# Answers for equivalent questions against the same catalog; the stricter threshold keeps
+# differently-scoped data questions apart. Namespaces are per catalog digest, and only the
+# most recently used catalogs are kept
+semantic_cache = SemanticCache(threshold=0.95, max_namespaces=16)
+
+# Schemas with more tables than this are pre-filtered with the table catalog search
+# service before the relevant-tables prompt
+RELEVANT_TABLES_LIMIT = 8
+
+# Table the table catalog search service indexes, one row per table, and the temporary
+# table index_catalog stages a fresh snapshot in; neither is part of the user's catalog
+TABLE_CATALOG_TABLE = "table_catalog"
+TABLE_CATALOG_STAGE = "table_catalog_stage"
+_CATALOG_INTERNAL_TABLES = {TABLE_CATALOG_TABLE.upper(), TABLE_CATALOG_STAGE.upper()}
+
+# Ranked tables whose context is appended to the example search query; the whole schema
+# would dilute it
+SEARCH_CONTEXT_TABLES = 5
+
+# Word stems that suggest a question needs table data; questions matching none of them,
+# nor any table/column name of the catalog, are answered "No Snowflake data required"
+# without an embedding or LLM call
+_DATA_HINT_RE = re.compile(
+    r"\b(?:data|table|column|row|record|sql|quer|select|join|schema|warehouse|snowflake|"
+    r"sum|count|total|averag|avg|mean|median|min|max|distinct|group|aggregat|filter|sort|rank|top|"
+    r"metric|kpi|report|dashboard|analy|insight|trend|statistic|distribution|compar|breakdown|"
+    r"chart|plot|visuali|graph|predict|forecast|model|train|classif|cluster|regress|segment|"
+    r"sales|revenue|cost|price|profit|payment|transaction|order|customer|user|driver|product|"
+    r"performance|usage|churn|growth|daily|weekly|monthly|yearly|per|"
+    r"how many|how much|number|amount|last|week|month|year|day|date|time)",
+    re.IGNORECASE
+)
+
+# SHOW output is capped at this many rows; at the cap the listing may be truncated
+SHOW_ROW_LIMIT = 10000
+
+# SHOW COLUMNS reports internal type names, map them to the information_schema names
+_SHOW_TYPE_NAMES = {
+    'FIXED': 'NUMBER',
+    'REAL': 'FLOAT',
+}
+
+# Statement texts are kept byte-identical across calls so Snowflake can reuse their
+# compiled plans; Snowpark has no client-side prepared statements to rebind
+COMPLETE_SQL = "SELECT snowflake.cortex.complete(?, parse_json(?), parse_json(?))"
+COMPLETE_PARAMETERS = json.dumps({
+    'temperature': MODEL_TEMPERATURE,
+})
+
+TABLES_SQL = """
+    SELECT 
+        table_name,
+        table_type,
+        comment
+    FROM information_schema.tables 
+    WHERE table_schema = CURRENT_SCHEMA()
+"""
+
+COLUMNS_SQL = """
+    SELECT 
+        table_name,
+        column_name,
+        data_type,
+        is_nullable,
+        comment
+    FROM information_schema.columns
+    WHERE table_schema = CURRENT_SCHEMA()
+        AND table_name IN ({placeholders})
+    ORDER BY table_name, ordinal_position
+"""
+
+# Table names bound per information_schema.columns query
+COLUMNS_QUERY_TABLES = 1000
+
+def _show_column_type(data_type: str) -> str:
+    """Type name from the JSON `data_type` of a SHOW COLUMNS row"""
+    try:
+        type_name = json.loads(data_type).get('type', data_type)
+    except (TypeError, ValueError):
+        return data_type
+    return _SHOW_TYPE_NAMES.get(type_name, type_name)
+
+def _query_words(query: str) -> Set[str]:
+    return {word.rstrip('s') for word in re.findall(r"[a-z0-9]+", query.lower())}
+
+def _name_overlap(words: Set[str], table_info: "TableInfo") -> int:
+    """Number of the table's own and column names sharing a word with the question"""
+    return sum(
+        1
+        for name in (table_info.name, *table_info.col_names)
+        if words.intersection(part.rstrip('s') for part in name.lower().split('_') if len(part) > 2)
+    )
+
+def _chat_messages(system: str, prompt: str) -> str:
+    return json.dumps([
+        {
+            'role': 'system', 
+            'content': system
+        },
+        {
+            'role': 'user', 
+            'content': prompt
+        }
+    ])
+
+def _complete_text(result: str) -> Optional[str]:
+    """Content of the first choice of a Cortex Complete (messages form) result"""
+    response = json.loads(result)
+    if response and 'choices' in response and len(response['choices']) > 0:
+        return response['choices'][0]['messages'].strip()
+
+def _complete_batch(session: Session, model: str, messages: List[str]) -> List[Optional[str]]:
+    """Run several independent chat completions in a single SQL statement
+    
+    Args:
+        session: Snowflake session
+        model: Name of the Cortex model
+        messages: JSON message lists, one per completion
+        
+    Returns:
+        Response texts in the order of `messages`
+    """
+    values = ", ".join(["(?, ?)"] * len(messages))
+    params = [model, COMPLETE_PARAMETERS]
+    for i, message in enumerate(messages):
+        params.extend([i, message])
+
+    rows = session.sql(f"""
+        SELECT t.i, snowflake.cortex.complete(?, parse_json(t.messages), parse_json(?))
+        FROM VALUES {values} AS t(i, messages)
+        ORDER BY t.i
+    """, params=params).collect()
+    return [_complete_text(row[1]) for row in rows]
 
 @dataclass
 class TableInfo:
     """Container for table information"""
     name: str
     description: str
-    columns: Dict[str, Dict[str, str]]  # column_name -> {type, description, nullable}
+    # Columns as parallel lists (one entry per column), formatted in a single pass
+    col_names: List[str] = field(default_factory=list)
+    col_types: List[str] = field(default_factory=list)
+    col_nullable: List[bool] = field(default_factory=list)
+    col_desc: List[str] = field(default_factory=list)
 
 class SnowflakeTableInput(BaseModel):
     """Input schema for table search and query generation."""
@@ -24,18 +172,63 @@ class SnowflakeTableInput(BaseModel):
 
 
 class RAGSQLGenerator:
-    def __init__(self, session: Session, model_name: str = "mistral-large2", num_examples: int = 3):
+    SYSTEM_PROMPT = 'You are a helpful AI assistant to generate Snowflake SQL query using user specified data, dont use provided implementation example as it is but adapt it into user data to generate new SQL query. DO NOT make any assumption on tables/column unless it is provided in the examples'
+
+    # Static instructions and the table information come first, the question last,
+    # so calls against the same tables share the longest possible prompt prefix
+    _PROMPT_HEADER = """[INST]
+        As an expert SQL engineer, generate a Snowflake SQL query for the question at the end.
+
+        Table Information:
+        {table_context}
+
+        Here are some similar examples to help guide you:
+
+        """
+    _EXAMPLE_TPL = """Example {i}:
+            Question: {question}
+{context}            SQL: {sql}
+{explanation}
+            """
+    _EXAMPLE_CONTEXT_TPL = "            Table Information: {}\n"
+    _EXAMPLE_EXPLANATION_TPL = "            Explanation: {}\n"
+    _PROMPT_FOOTER = """
+        Based on these examples and the provided table information, generate a Snowflake SQL query for the question below.
+        Output only the SQL query without any explanation or additional text.
+
+        Question: {question}
+        [/INST]"""
+
+    # Columns fetched per example; context and explanation can be kilobytes each
+    FAST_EXAMPLE_COLUMNS = ["prompt_text", "sql_query"]
+    FULL_EXAMPLE_COLUMNS = FAST_EXAMPLE_COLUMNS + ["sql_context", "sql_explanation"]
+
+    def __init__(
+        self,
+        session: Session,
+        model_name: str = "mistral-large2",
+        num_examples: int = 3,
+        full_examples: Optional[bool] = None,
+        pool: Optional[SessionPool] = None
+    ):
         """Initialize the RAG SQL generator
         
         Args:
             session: Snowflake session
             model_name: Name of the Cortex model to use
             num_examples: Number of examples to retrieve
+            full_examples: Also fetch each example's context and explanation; by default
+                only when more than 3 examples are retrieved
+            pool: Optional session pool, so concurrent generations don't queue on `session`
         """
         self.session = session
-        self.root = Root(session)
+        self.pool = pool
+        self._search_services = CortexSearchServices(session)
         self.model_name = model_name
         self.num_examples = num_examples
+        if full_examples is None:
+            full_examples = num_examples > 3
+        self.example_columns = self.FULL_EXAMPLE_COLUMNS if full_examples else self.FAST_EXAMPLE_COLUMNS
 
     def retrieve_examples(self, query: str, table_context: str = None) -> List[Dict]:
         """Retrieve similar examples from Cortex Search
@@ -44,12 +237,7 @@ class RAGSQLGenerator:
             query: Natural language query
             table_context: SQL table/schema information
         """
-        search_service = (
-            self.root
-            .databases[self.session.get_current_database()]
-            .schemas[self.session.get_current_schema()]
-            .cortex_search_services['sql_query_search_svc']
-        )
+        search_service = self._search_services.get('sql_query_search_svc')
 
         search_query = query
         if table_context:
@@ -57,7 +245,7 @@ class RAGSQLGenerator:
 
         response = search_service.search(
             query=search_query,
-            columns=["prompt_text", "sql_query", "sql_context", "sql_explanation"],
+            columns=self.example_columns,
             limit=self.num_examples
         )
 
@@ -71,34 +259,23 @@ class RAGSQLGenerator:
             table_context: Table/schema information
             examples: Similar examples for few-shot learning
         """
-        prompt = f"""[INST]
-        As an expert SQL engineer, generate a Snowflake SQL query for the following question:
-
-        Question: {question}
-
-        Table Information:
-        {table_context}
-
-        Here are some similar examples to help guide you:
-
-        """
-        for i, example in enumerate(examples, 1):
-            prompt += f"""Example {i}:
-            Question: {example['prompt_text']}
-            Table Information: {example.get('sql_context', '')}
-            SQL: {example['sql_query']}
-            Explanation: {example.get('sql_explanation', '')}
-
-            """
-
-        prompt += f"""
-        Based on these examples and the provided table information, generate a Snowflake SQL query for the original question:
-        {question}
-
-        Output only the SQL query without any explanation or additional text.
-        [/INST]"""
-
-        return prompt
+        parts = [self._PROMPT_HEADER.format(table_context=table_context)]
+        parts.extend(self._format_example(i, example) for i, example in enumerate(examples, 1))
+        parts.append(self._PROMPT_FOOTER.format(question=question))
+        return "".join(parts)
+
+    @classmethod
+    def _format_example(cls, i: int, example: Dict) -> str:
+        """One few-shot example, leaving out context/explanation lines that are empty or not fetched"""
+        context = example.get('sql_context')
+        explanation = example.get('sql_explanation')
+        return cls._EXAMPLE_TPL.format(
+            i=i,
+            question=example['prompt_text'],
+            context=cls._EXAMPLE_CONTEXT_TPL.format(context) if context else "",
+            sql=example['sql_query'],
+            explanation=cls._EXAMPLE_EXPLANATION_TPL.format(explanation) if explanation else ""
+        )
 
     def run_cortex_complete(self, prompt: str) -> str:
         """Run Cortex Complete model
@@ -106,43 +283,44 @@ class RAGSQLGenerator:
         Args:
             prompt: Input prompt for the model
         """
-        messages = json.dumps([
-            {
-                'role': 'system', 
-                'content': 'You are a helpful AI assistant to generate Snowflake SQL query using user specified data, dont use provided implementation example as it is but adapt it into user data to generate new SQL query. DO NOT make any assumption on tables/column unless it is provided in the examples'
-            },
-            {
-                'role': 'user', 
-                'content': prompt
-            }
-        ])
-
-        parameters = json.dumps({                               
-            'temperature': MODEL_TEMPERATURE,
-        })
-        
-        result = self.session.sql(
-            "SELECT snowflake.cortex.complete(?, parse_json(?), parse_json(?))",
-            params=[MODEL_NAME, messages, parameters]
-        ).collect()[0][0]
-
-        response = json.loads(result)
-        
-        if response and 'choices' in response and len(response['choices']) > 0:
-            return response['choices'][0]['messages'].strip()
-
-    def generate_sql(self, question: str, table_context: str = None) -> Dict:
+        messages = self.messages(prompt)
+
+        with borrow(self.pool, self.session) as session:
+            result = session.sql(
+                COMPLETE_SQL,
+                params=[MODEL_NAME, messages, COMPLETE_PARAMETERS]
+            ).collect()[0][0]
+
+        return _complete_text(result)
+
+    def messages(self, prompt: str) -> str:
+        """Chat messages (JSON) for a SQL generation prompt"""
+        return _chat_messages(self.SYSTEM_PROMPT, prompt)
+
+    def generate_sql(
+        self,
+        question: str,
+        table_context: str = None,
+        examples: Optional[List[Dict]] = None,
+        return_debug: bool = False
+    ) -> Union[str, Dict]:
         """Generate SQL for a given question with table context
         
         Args:
             question: Natural language question
             table_context: Table/schema information
+            examples: Examples already retrieved for this question, fetched if not given
+            return_debug: Return a dict with the examples and prompt used instead of
+                only the generated SQL
         """
-        examples = self.retrieve_examples(question, table_context)
+        if examples is None:
+            examples = self.retrieve_examples(question, table_context)
         
         prompt = self.create_prompt(question, table_context or "", examples)
         
         generated_sql = self.run_cortex_complete(prompt)
+        if not return_debug:
+            return generated_sql
         
         return {
             'question': question,
@@ -158,149 +336,393 @@ class SnowflakeTableTool(BaseTool):
     generate SQL queries to analyze the data. Provides information about relevant tables 
     and their columns, along with SQL queries for implementation."""
     args_schema: Type[BaseModel] = SnowflakeTableInput
+    RELEVANT_TABLES_SYSTEM_PROMPT: ClassVar[str] = 'You are a helpful AI assistant that understand user specified data (tables/column) that useful to fulfill user requirements. recommend which tables and columns would be most relevant for the given query. DO NOT make any assumption on columns or tables beside the provided examples'
     
     def __init__(
         self, 
         snowpark_session: Session, 
         rag_generator: Optional['RAGSQLGenerator'] = None,
-        result_as_answer: bool = False
+        result_as_answer: bool = False,
+        table_catalog_svc: Optional[str] = None,
+        pool: Optional[SessionPool] = None
     ):
+        """
+        Args:
+            snowpark_session: Snowflake session
+            rag_generator: Generator used when SQL is requested
+            result_as_answer: Return the tool output as the final answer
+            table_catalog_svc: Cortex Search service over the table catalog; when set, wide
+                schemas only show the RELEVANT_TABLES_LIMIT best matching tables to the LLM.
+                Create and refresh it with index_catalog()
+            pool: Optional session pool, so concurrent calls don't queue on `snowpark_session`;
+                its sessions must default to the same database and schema
+        """
         super().__init__()
         self._session = snowpark_session
         self._rag_generator = rag_generator
+        self._table_catalog_svc = table_catalog_svc
+        self._pool = pool
+        self._search_services = CortexSearchServices(self._session)
+        # (database, schema) -> (fetched at, tables info, formatted context)
+        self._catalog_cache: Dict[Tuple[str, str], Tuple[float, Dict[str, TableInfo], str]] = {}
         self.result_as_answer = result_as_answer
 
-    def _get_tables_info(self) -> Dict[str, TableInfo]:
-        """Retrieve and organize table and column information."""
-        tables_info = {}
+    def invalidate_catalog(self) -> None:
+        """Drop cached catalogs, e.g. after tables were created or altered"""
+        self._catalog_cache.clear()
+
+    def _get_catalog(self) -> Tuple[Dict[str, TableInfo], str]:
+        """Table information and its formatted context, refetched at most every CATALOG_TTL seconds"""
+        key = self._search_services.location
+        cached = self._catalog_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < CATALOG_TTL:
+            return cached[1], cached[2]
+
+        with borrow(self._pool, self._session) as session:
+            tables_info = self._get_tables_info(session)
+        tables_context = self._format_table_context(tables_info)
+        self._catalog_cache[key] = (time.monotonic(), tables_info, tables_context)
+        return tables_info, tables_context
+
+    def index_catalog(self) -> None:
+        """Sync TABLE_CATALOG_TABLE with the current catalog and create the search service
         
-        tables_raw = self._session.sql("""
-            SELECT 
-                table_name,
-                table_type,
-                comment
-            FROM information_schema.tables 
-            WHERE table_schema = CURRENT_SCHEMA()
-        """).collect()
-
-        columns_raw = self._session.sql("""
-            SELECT 
-                table_name,
-                column_name,
-                data_type,
-                is_nullable,
-                comment
-            FROM information_schema.columns
-            WHERE table_schema = CURRENT_SCHEMA()
-            ORDER BY table_name, ordinal_position
-        """).collect()
-
-        for table in tables_raw:
-            table_name = table['TABLE_NAME']
-            tables_info[table_name] = TableInfo(
+        A setup step, run once and again after schema changes; it is never called while
+        answering questions. Rows are merged in place rather than the table being
+        recreated, so the search service's change tracking keeps working.
+        """
+        if not self._table_catalog_svc:
+            raise ValueError("index_catalog requires table_catalog_svc")
+
+        tables_info, _ = self._get_catalog()
+        rows = [
+            (
+                table_info.name,
+                f"{table_info.name}: {table_info.description}. Columns: {', '.join(table_info.col_names)}"
+            )
+            for table_info in tables_info.values()
+        ]
+
+        with borrow(self._pool, self._session) as session:
+            session.sql(f"""
+                CREATE TABLE IF NOT EXISTS {TABLE_CATALOG_TABLE} (
+                    table_name VARCHAR,
+                    description_text VARCHAR
+                ) CHANGE_TRACKING = TRUE
+            """).collect()
+
+            session.create_dataframe(
+                rows, schema=["table_name", "description_text"]
+            ).write.save_as_table(TABLE_CATALOG_STAGE, mode="overwrite", table_type="temporary")
+            try:
+                session.sql(f"""
+                    MERGE INTO {TABLE_CATALOG_TABLE} t
+                    USING {TABLE_CATALOG_STAGE} s
+                    ON t.table_name = s.table_name
+                    WHEN MATCHED AND t.description_text <> s.description_text THEN
+                        UPDATE SET description_text = s.description_text
+                    WHEN NOT MATCHED THEN
+                        INSERT (table_name, description_text) VALUES (s.table_name, s.description_text)
+                """).collect()
+                session.sql(f"""
+                    DELETE FROM {TABLE_CATALOG_TABLE} t
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM {TABLE_CATALOG_STAGE} s WHERE s.table_name = t.table_name
+                    )
+                """).collect()
+            finally:
+                session.sql(f"DROP TABLE IF EXISTS {TABLE_CATALOG_STAGE}").collect()
+
+            session.sql(f"""
+                CREATE CORTEX SEARCH SERVICE IF NOT EXISTS {self._table_catalog_svc}
+                ON description_text
+                ATTRIBUTES table_name
+                WAREHOUSE = {session.get_current_warehouse()}
+                TARGET_LAG = '1 hour'
+                AS
+                    SELECT table_name, description_text
+                    FROM {TABLE_CATALOG_TABLE}
+            """).collect()
+
+    def _filter_tables(self, query: str, tables_info: Dict[str, TableInfo]) -> Optional[Dict[str, TableInfo]]:
+        """The tables the catalog search service ranks highest for the query, best first
+        
+        None when no service is configured, the schema is small, or the search returns
+        nothing usable; callers then use the full catalog.
+        """
+        if not self._table_catalog_svc or len(tables_info) <= RELEVANT_TABLES_LIMIT:
+            return None
+        try:
+            response = self._search_services.get(self._table_catalog_svc).search(
+                query=query, columns=["table_name"], limit=RELEVANT_TABLES_LIMIT
+            )
+        except Exception as e:
+            logger.warning("Table catalog search failed, using all tables: %s", e)
+            return None
+
+        relevant = {
+            result['table_name']: tables_info[result['table_name']]
+            for result in response.results
+            if result.get('table_name') in tables_info
+        }
+        return relevant or None
+
+    @staticmethod
+    def _rank_by_overlap(query: str, tables_info: Dict[str, TableInfo], limit: int) -> Dict[str, TableInfo]:
+        """Up to `limit` tables whose table/column names share the most words with the query"""
+        words = _query_words(query)
+        scored = [(_name_overlap(words, table_info), table_info) for table_info in tables_info.values()]
+        scored = sorted((item for item in scored if item[0] > 0), key=lambda item: -item[0])
+        return {table_info.name: table_info for _, table_info in scored[:limit]}
+
+    def _may_need_data(self, query: str) -> bool:
+        """Cheap pre-check: False only when the question names no data keyword or known table/column"""
+        if _DATA_HINT_RE.search(query):
+            return True
+        # Loads the catalog on a cold cache; it is needed for any data question anyway
+        tables_info, _ = self._get_catalog()
+        words = _query_words(query)
+        return any(_name_overlap(words, table_info) for table_info in tables_info.values())
+
+    def _get_tables_info(self, session: Session) -> Dict[str, TableInfo]:
+        """Retrieve and organize table and column information."""
+        try:
+            tables_raw, columns_raw = self._show_catalog(session)
+        except Exception as e:
+            # SHOW output is capped, fall back to the (slower) information_schema
+            logger.warning("SHOW catalog unavailable (%s), falling back to information_schema", e)
+            tables_raw, columns_raw = self._information_schema_catalog(session)
+
+        tables_info = {
+            table_name: TableInfo(
                 name=table_name,
-                description=table['COMMENT'] if table['COMMENT'] else 'No description available',
-                columns={}
+                description=comment if comment else 'No description available'
             )
+            for table_name, comment in tables_raw
+            if table_name.upper() not in _CATALOG_INTERNAL_TABLES
+        }
 
-            table_columns = [col for col in columns_raw if col['TABLE_NAME'] == table_name]
-            for col in table_columns:
-                tables_info[table_name].columns[col['COLUMN_NAME']] = {
-                    'type': col['DATA_TYPE'],
-                    'nullable': col['IS_NULLABLE'] == 'YES',
-                    'description': col['COMMENT'] if col['COMMENT'] else 'No description'
-                }
+        # Append each column to its table in one pass instead of scanning all columns per table
+        for table_name, column_name, data_type, nullable, comment in columns_raw:
+            table_info = tables_info.get(table_name)
+            if table_info is None:
+                continue
+            table_info.col_names.append(column_name)
+            table_info.col_types.append(data_type)
+            table_info.col_nullable.append(nullable)
+            table_info.col_desc.append(comment if comment else 'No description')
 
         return tables_info
 
+    def _show_catalog(self, session: Session):
+        """Tables and columns of the current schema from SHOW commands
+        
+        SHOW runs in the cloud services layer, without a warehouse, and is much faster
+        than querying information_schema.
+        """
+        # Issue both catalog commands before waiting on either
+        tables_job = session.sql("SHOW OBJECTS IN SCHEMA").collect_nowait()
+        columns_job = session.sql("SHOW COLUMNS IN SCHEMA").collect_nowait()
+
+        tables = tables_job.result()
+        columns = columns_job.result()
+        if len(tables) >= SHOW_ROW_LIMIT or len(columns) >= SHOW_ROW_LIMIT:
+            raise RuntimeError("SHOW output reached the row limit")
+
+        tables_raw = [(table['name'], table['comment']) for table in tables]
+        return tables_raw, self._show_columns_raw(columns)
+
+    @staticmethod
+    def _show_columns_raw(columns) -> List[Tuple]:
+        return [
+            (
+                col['table_name'],
+                col['column_name'],
+                _show_column_type(col['data_type']),
+                col['null?'] == 'true',
+                col['comment']
+            )
+            for col in columns
+        ]
+
+    def _information_schema_catalog(self, session: Session):
+        """Tables and columns of the current schema from information_schema
+        
+        Columns are only fetched for the listed tables, bound in chunks of
+        COLUMNS_QUERY_TABLES names, instead of every column of the schema; if that
+        still fails (e.g. too much data) they are read per table with SHOW COLUMNS.
+        """
+        tables_raw = [(table['TABLE_NAME'], table['COMMENT']) for table in session.sql(TABLES_SQL).collect()]
+        table_names = [table_name for table_name, _ in tables_raw]
+
+        try:
+            # Issue every chunk before waiting on any
+            columns_jobs = []
+            for start in range(0, len(table_names), COLUMNS_QUERY_TABLES):
+                chunk = table_names[start:start + COLUMNS_QUERY_TABLES]
+                columns_jobs.append(session.sql(
+                    COLUMNS_SQL.format(placeholders=", ".join(["?"] * len(chunk))),
+                    params=chunk
+                ).collect_nowait())
+
+            columns_raw = [
+                (
+                    col['TABLE_NAME'],
+                    col['COLUMN_NAME'],
+                    col['DATA_TYPE'],
+                    col['IS_NULLABLE'] == 'YES',
+                    col['COMMENT']
+                )
+                for job in columns_jobs
+                for col in job.result()
+            ]
+        except Exception as e:
+            logger.warning("information_schema columns query failed (%s), reading columns per table", e)
+            columns_raw = self._show_columns_per_table(session, table_names)
+
+        return tables_raw, columns_raw
+
+    def _show_columns_per_table(self, session: Session, table_names: List[str]) -> List[Tuple]:
+        """Columns from one SHOW COLUMNS IN TABLE per table, all issued before waiting"""
+        columns_jobs = [
+            session.sql(
+                'SHOW COLUMNS IN TABLE "{}"'.format(table_name.replace('"', '""'))
+            ).collect_nowait()
+            for table_name in table_names
+        ]
+        return [
+            column
+            for job in columns_jobs
+            for column in self._show_columns_raw(job.result())
+        ]
+
     def _format_table_context(self, tables_info: Dict[str, TableInfo]) -> str:
         """Format tables information into a structured context string."""
-        context_parts = []
-        
-        for table_info in tables_info.values():
-            columns_text = "\n".join([
-                f"- {col_name} ({details['type']}){'[nullable]' if details['nullable'] else ''}: {details['description']}"
-                for col_name, details in table_info.columns.items()
-            ])
-            
-            context_parts.append(f"""
+        return "\n\n".join(
+            f"""
             Table: {table_info.name}
             Description: {table_info.description}
             Columns:
-            {columns_text}
-            """)
-
-        return "\n\n".join(context_parts)
+            {self._format_columns(table_info)}
+            """
+            for table_info in tables_info.values()
+        )
 
-    def _get_relevant_tables(self, query: str, tables_context: str) -> str:
-        """Use LLM to identify relevant tables for the query."""
+    @staticmethod
+    def _format_columns(table_info: TableInfo) -> str:
+        return "\n".join(map(
+            "- {} ({}){}: {}".format,
+            table_info.col_names,
+            table_info.col_types,
+            ["[nullable]" if nullable else "" for nullable in table_info.col_nullable],
+            table_info.col_desc
+        ))
+
+    def _relevant_tables_messages(self, query: str, tables_context: str) -> str:
+        """Chat messages (JSON) asking the LLM to identify relevant tables for the query."""
+        # Static instructions, then the per-schema tables, then the question: the prefix
+        # shared by calls against the same catalog stays identical
         prompt = f"""
         Based on the following Snowflake tables information, recommend which tables and columns 
         would be most relevant for the given query. Be concise and clear.
 
-        Available Tables Information:
-        {tables_context}
-
-        Query: {query}
-
         Please provide:
         1. Most relevant tables for this query
         2. Key columns that could be useful, with their data types
         3. Brief explanation of why these tables/columns are relevant
 
         If no related/relevant tables are found, respond with: "No Snowflake data required".
+
+        Available Tables Information:
+        {tables_context}
+
+        Query: {query}
         """
         
-        messages = json.dumps([
-            {
-                'role': 'system', 
-                'content': 'You are a helpful AI assistant that understand user specified data (tables/column) that useful to fulfill user requirements. recommend which tables and columns would be most relevant for the given query. DO NOT make any assumption on columns or tables beside the provided examples'
-            },
-            {
-                'role': 'user', 
-                'content': prompt
-            }
-        ])
-
-        parameters = json.dumps({                               
-            'temperature': MODEL_TEMPERATURE,
-        })
-        
-        result = self._session.sql(
-            "SELECT snowflake.cortex.complete(?, parse_json(?), parse_json(?))",
-            params=[MODEL_NAME, messages, parameters]
-        ).collect()[0][0]
+        return _chat_messages(self.RELEVANT_TABLES_SYSTEM_PROMPT, prompt)
 
-        response = json.loads(result)
-        
-        # Extract just the messages content from the first choice
-        if response and 'choices' in response and len(response['choices']) > 0:
-            return response['choices'][0]['messages'].strip()
+    def _get_relevant_tables(self, query: str, tables_context: str) -> str:
+        """Use LLM to identify relevant tables for the query."""
+        messages = self._relevant_tables_messages(query, tables_context)
+
+        with borrow(self._pool, self._session) as session:
+            result = session.sql(
+                COMPLETE_SQL,
+                params=[MODEL_NAME, messages, COMPLETE_PARAMETERS]
+            ).collect()[0][0]
+
+        return _complete_text(result)
 
     def _run(self, query: str, generate_sql: bool = False) -> str:
         """Search for relevant tables and optionally generate SQL query."""
-        print(f"`SnowflakeTableTool` called with query: {query}, generate_sql: {generate_sql}")
-
-        tables_info = self._get_tables_info()
-        tables_context = self._format_table_context(tables_info)
+        logger.debug("`SnowflakeTableTool` called with query: %s, generate_sql: %s", query, generate_sql)
+
+        if not generate_sql and not self._may_need_data(query):
+            # Nothing in the question points at data, skip the embedding and the LLM call
+            return "No Snowflake data required"
+
+        tables_info, tables_context = self._get_catalog()
+
+        # Keyed on a digest of the catalog text so answers are dropped once the schema changes
+        cache_namespace = ("sql", generate_sql, context_key(tables_context))
+        cached = semantic_cache.get_exact(cache_namespace, query)
+        if cached is not None:
+            return cached
+        with borrow(self._pool, self._session) as session:
+            query_embedding = embed_text(session, query)
+        cached = semantic_cache.lookup(cache_namespace, query, query_embedding)
+        if cached is not None:
+            return cached
         
-        tables_analysis = self._get_relevant_tables(query, tables_context)
-        
-        if "No Snowflake data required" in tables_analysis:
-            return tables_analysis
-            
+        # Only the tables relevant to the question go into the prompts
+        relevant = self._filter_tables(query, tables_info)
+        prompt_context = self._format_table_context(relevant) if relevant else tables_context
+
         generated_sql = ""
+        sql_prompt = sql_error = None
         if generate_sql and self._rag_generator:
+            # Both completions below run in one statement and the SQL prompt needs the
+            # examples, so retrieval comes first
             try:
-                sql_result = self._rag_generator.generate_sql(
-                    question=query,
-                    table_context=tables_context
+                # Only the top ranked tables go into the example search query: the catalog
+                # search order when it ran, otherwise name overlap with the question
+                search_tables = relevant or self._rank_by_overlap(query, tables_info, SEARCH_CONTEXT_TABLES)
+                search_context = self._format_table_context(
+                    dict(list(search_tables.items())[:SEARCH_CONTEXT_TABLES])
                 )
-                generated_sql = sql_result['generated_sql']
+                examples = self._rag_generator.retrieve_examples(query, search_context)
+                sql_prompt = self._rag_generator.create_prompt(query, prompt_context, examples)
             except Exception as e:
-                generated_sql = f"\n\nSQL Generation Error: {str(e)}"
+                sql_error = e
+
+        if sql_prompt is None:
+            tables_analysis = self._get_relevant_tables(query, prompt_context)
+        else:
+            # Once the examples are in, both completions are independent: run them in one statement
+            try:
+                with borrow(self._pool, self._session) as session:
+                    tables_analysis, generated_sql = _complete_batch(
+                        session,
+                        MODEL_NAME,
+                        [
+                            self._relevant_tables_messages(query, prompt_context),
+                            self._rag_generator.messages(sql_prompt)
+                        ]
+                    )
+            except Exception as e:
+                tables_analysis, sql_error = self._get_relevant_tables(query, prompt_context), e
+        
+        if "No Snowflake data required" in tables_analysis:
+            semantic_cache.store(cache_namespace, query, query_embedding, tables_analysis)
+            return tables_analysis
+
+        if sql_error is not None:
+            # Not cached, so the next call retries the generation
+            return f"{tables_analysis}\n\nSQL Generation Error: {str(sql_error)}"
         
-        return f"{tables_analysis}{generated_sql}"
+        response = f"{tables_analysis}{generated_sql}"
+        semantic_cache.store(cache_namespace, query, query_embedding, response)
+        return response
 
 # # Usage:
 # from snowflake.snowpark.session import Session
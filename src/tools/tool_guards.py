@@ -0,0 +1,33 @@
+from functools import wraps
+from typing import Callable
+import logging
+
+logger = logging.getLogger(__name__)
+
+def guard_tool(error_prefix: str) -> Callable:
+    """Log a tool failure once and re-raise it as RuntimeError("<prefix>: <error>")"""
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return fn(self, *args, **kwargs)
+            except Exception as e:
+                error_message = f"{error_prefix}: {str(e)}"
+                logger.exception(error_message)
+                raise RuntimeError(error_message) from e
+        return wrapper
+    return decorator
+
+def answer_on_error(failure_prefix: str) -> Callable:
+    """Return "<prefix>: <error>" instead of raising when the tool has result_as_answer set"""
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return fn(self, *args, **kwargs)
+            except Exception as e:
+                if self.result_as_answer:
+                    return f"{failure_prefix}: {str(e)}"
+                raise
+        return wrapper
+    return decorator